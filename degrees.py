@@ -1,5 +1,19 @@
+import asyncio
+import bisect
 import csv
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import random
 import sys
+import time
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from urllib.parse import parse_qs, urlsplit
 
 from util import Node, StackFrontier, QueueFrontier
 
@@ -11,12 +25,819 @@ people = {}
 
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
+
+# Compact co-star graph, used instead of the dictionaries above once
+# load_data has been called with compact=True
+graph = None
 directory = "C:/Users/Pimek/Documents/degrees/degrees/small"
 
-def load_data(directory):
+# Binary snapshot of the compact graph, written next to the CSV files,
+# or under SNAPSHOT_CACHE if that directory is read-only
+SNAPSHOT_NAME = "degrees.snapshot"
+SNAPSHOT_CACHE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "degrees"
+)
+SNAPSHOT_MAGIC = b"DEGSNAP\0"
+SNAPSHOT_VERSION = 2
+
+# Landmark distance index for the compact graph, set by load_landmarks
+landmarks = None
+LANDMARKS_NAME = "degrees.landmarks"
+LANDMARK_COUNT = 16
+
+# Number of solved shortest_path results to keep
+PATH_CACHE_SIZE = 1024
+
+# Number of queries batch_queries reads before answering and writing them
+BATCH_CHUNK = 10000
+
+# Prefix and trigram index over all names, built on first use
+name_index = None
+
+
+class StringTable():
+    """
+    Read-only sequence of strings stored as one UTF-8 blob plus offsets.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        parts = [string.encode("utf-8") for string in strings]
+        offsets = array("q", [0])
+        offsets.extend(accumulate(map(len, parts)))
+        return cls(b"".join(parts), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class Graph():
+    """
+    Co-star graph with people and movies interned to integer indices.
+
+    The person -> movie and movie -> star adjacency is kept in CSR form:
+    the movies of person `p` are `person_movies[person_offsets[p]:
+    person_offsets[p + 1]]`, and likewise for the stars of a movie.
+    """
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_stars):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+        self._person_index = None
+        self._movie_index = None
+        self._snapshot = None
+
+    @classmethod
+    def from_csv(cls, directory, workers=None):
+        """
+        Build a graph from the people, movies and stars CSV files.
+
+        stars.csv is split into byte ranges that are parsed by `workers`
+        processes (all cores by default, in this process if 1).
+        """
+        person_ids, person_names, person_births = _read_columns(
+            f"{directory}/people.csv", ("id", "name", "birth")
+        )
+        person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+
+        movie_ids, movie_titles, movie_years = _read_columns(
+            f"{directory}/movies.csv", ("id", "title", "year")
+        )
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+        # (person, movie) edges come back as sorted, distinct integers,
+        # so every CSR row comes out sorted
+        width = len(movie_ids)
+        edges = load_stars(
+            f"{directory}/stars.csv", person_index, movie_index, workers
+        )
+        edge_people = edges // width if width else edges
+        edge_movies = edges % width if width else edges
+
+        graph = cls.from_edges(
+            StringTable.from_strings(person_ids),
+            StringTable.from_strings(person_names),
+            StringTable.from_strings(person_births),
+            StringTable.from_strings(movie_ids),
+            StringTable.from_strings(movie_titles),
+            StringTable.from_strings(movie_years),
+            edge_people, edge_movies
+        )
+        graph._person_index = person_index
+        graph._movie_index = movie_index
+        return graph
+
+    @classmethod
+    def from_edges(cls, person_ids, person_names, person_births,
+                   movie_ids, movie_titles, movie_years,
+                   edge_people, edge_movies):
+        """
+        Build a graph from string tables and parallel arrays of
+        (person, movie) edges.
+        """
+        person_offsets, person_movies = _csr(
+            len(person_ids), edge_people, edge_movies
+        )
+        movie_offsets, movie_stars = _csr(
+            len(movie_ids), edge_movies, edge_people
+        )
+        return cls(
+            person_ids, person_names, person_births,
+            movie_ids, movie_titles, movie_years,
+            person_offsets, person_movies, movie_offsets, movie_stars
+        )
+
+    @property
+    def person_index(self):
+        """
+        Maps IMDB person ids to graph indices, built on first use.
+        """
+        if self._person_index is None:
+            self._person_index = {
+                person_id: i for i, person_id in enumerate(self.person_ids)
+            }
+        return self._person_index
+
+    @property
+    def movie_index(self):
+        """
+        Maps IMDB movie ids to graph indices, built on first use.
+        """
+        if self._movie_index is None:
+            self._movie_index = {
+                movie_id: i for i, movie_id in enumerate(self.movie_ids)
+            }
+        return self._movie_index
+
+    def save(self, filename, key):
+        """
+        Write the graph to a binary snapshot at `filename`
+        (see `_write_snapshot`).
+        """
+        sections = {}
+        for name in ("person_ids", "person_names", "person_births",
+                     "movie_ids", "movie_titles", "movie_years"):
+            table = getattr(self, name)
+            sections[f"{name}.blob"] = (bytes(table.blob), "B")
+            sections[f"{name}.offsets"] = (bytes(table.offsets), "q")
+        for name in ("person_offsets", "person_movies",
+                     "movie_offsets", "movie_stars"):
+            sections[name] = (bytes(getattr(self, name)), "i")
+        _write_snapshot(filename, key, sections)
+
+    @classmethod
+    def load(cls, filename, key):
+        """
+        Memory-map a snapshot written by `save`.
+
+        Returns None if the file is missing, unreadable, or was written
+        for a different `key`, version or platform.
+        """
+        loaded = _read_snapshot(filename, key)
+        if loaded is None:
+            return None
+        snapshot, sections = loaded
+
+        tables = [
+            StringTable(sections[f"{name}.blob"], sections[f"{name}.offsets"])
+            for name in ("person_ids", "person_names", "person_births",
+                         "movie_ids", "movie_titles", "movie_years")
+        ]
+        graph = cls(
+            *tables,
+            sections["person_offsets"], sections["person_movies"],
+            sections["movie_offsets"], sections["movie_stars"]
+        )
+        graph._snapshot = snapshot
+        return graph
+
+    def movie_count(self, person):
+        return self.person_offsets[person + 1] - self.person_offsets[person]
+
+    def neighbors(self, person, expanded_movies=None):
+        """
+        Yields (movie, person) index pairs for people who starred
+        with `person`, walking the CSR arrays in place.
+
+        If `expanded_movies` is a set, movies already in it are skipped
+        and the movies walked are added to it.
+        """
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for i in range(self.person_offsets[person],
+                       self.person_offsets[person + 1]):
+            movie = person_movies[i]
+            if expanded_movies is not None:
+                if movie in expanded_movies:
+                    continue
+                expanded_movies.add(movie)
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                yield movie, movie_stars[j]
+
+
+def _write_snapshot(filename, key, sections):
+    """
+    Write `sections`, a dictionary of name -> (bytes, typecode), to a
+    binary snapshot at `filename`.
+
+    The file is an 8-byte magic string, the length of a JSON header,
+    the header itself (version, `key`, and the offset, length and
+    typecode of every section), then the raw sections, each aligned
+    to 8 bytes so they can be memory-mapped in place.
+    """
+    layout = {}
+    offset = 0
+    for name, (data, typecode) in sections.items():
+        layout[name] = [offset, len(data), typecode]
+        offset += len(data) + -len(data) % 8
+    header = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "key": key,
+        "format": _snapshot_format(),
+        "sections": layout
+    }).encode("utf-8")
+    header += b" " * (-len(header) % 8)
+
+    # Write to a temporary file first so readers never see half a snapshot
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for data, _ in sections.values():
+                f.write(data)
+                f.write(bytes(-len(data) % 8))
+        os.replace(temporary, filename)
+    except OSError:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _read_snapshot(filename, key):
+    """
+    Memory-map a snapshot written by `_write_snapshot` and return
+    (mmap, sections), where sections maps names to memoryviews.
+
+    Returns None if the file is missing, unreadable, or was written
+    for a different `key`, version or platform.
+    """
+    try:
+        with open(filename, "rb") as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if snapshot[:8] != SNAPSHOT_MAGIC:
+            return None
+        length = int.from_bytes(snapshot[8:16], "little")
+        header = json.loads(snapshot[16:16 + length].decode("utf-8"))
+    except ValueError:
+        return None
+    if (header.get("version") != SNAPSHOT_VERSION or
+            header.get("key") != key or
+            header.get("format") != _snapshot_format()):
+        return None
+
+    view = memoryview(snapshot)
+    start = 16 + length
+    sections = {
+        name: view[start + offset:start + offset + size].cast(typecode)
+        for name, (offset, size, typecode) in header["sections"].items()
+    }
+    return snapshot, sections
+
+
+def _snapshot_format():
+    """
+    Returns the platform details a snapshot's raw arrays depend on.
+    """
+    return [sys.byteorder, array("i").itemsize, array("q").itemsize]
+
+
+def _snapshot_key(directory):
+    """
+    Returns the size and modification time of each CSV file, which
+    identifies the data a snapshot was built from.
+    """
+    key = []
+    for name in ("people.csv", "movies.csv", "stars.csv"):
+        stat = os.stat(os.path.join(directory, name))
+        key.append([name, stat.st_size, stat.st_mtime_ns])
+    return key
+
+
+def _snapshot_files(directory, name):
+    """
+    Returns the places a snapshot called `name` for `directory` may be
+    kept: next to the CSV files, then in SNAPSHOT_CACHE under a name
+    derived from the directory's absolute path.
+    """
+    path = os.path.abspath(directory).encode("utf-8")
+    digest = hashlib.sha1(path).hexdigest()[:16]
+    return [
+        os.path.join(directory, name),
+        os.path.join(SNAPSHOT_CACHE, f"{digest}-{name}")
+    ]
+
+
+def _save_snapshot(save, filenames, key):
+    """
+    Calls `save(filename, key)` for the first of `filenames` that can be
+    written. Returns the filename used, or None if none could be.
+    """
+    for filename in filenames:
+        try:
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            save(filename, key)
+            return filename
+        except OSError:
+            continue
+    return None
+
+
+def load_graph(directory, snapshot=True, workers=None):
+    """
+    Returns the compact graph for `directory`.
+
+    If `snapshot` is True, memory-map the binary snapshot for `directory`
+    (see `_snapshot_files`) when it matches the CSV files, and otherwise
+    parse the CSV files with `workers` processes (see `Graph.from_csv`)
+    and (re)write the snapshot for next time.
+    """
+    if not snapshot:
+        return Graph.from_csv(directory, workers)
+
+    filenames = _snapshot_files(directory, SNAPSHOT_NAME)
+    key = _snapshot_key(directory)
+    for filename in filenames:
+        loaded = Graph.load(filename, key)
+        if loaded is not None:
+            return loaded
+
+    loaded = Graph.from_csv(directory, workers)
+    _save_snapshot(loaded.save, filenames, key)
+    return loaded
+
+
+def _read_columns(filename, names):
+    """
+    Returns a list of the values in each of the columns `names` of a
+    CSV file with a header row.
+    """
+    with open(filename, encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    columns = [header.index(name) for name in names]
+    return [[row[i] for row in rows] for i in columns]
+
+
+def load_stars(filename, person_index, movie_index, workers=None):
+    """
+    Returns a sorted numpy array of the distinct (person, movie) edges in
+    a stars CSV file, each encoded as person * len(movie_index) + movie.
+
+    The file is cut into byte ranges at line boundaries and the ranges
+    are parsed in a pool of `workers` processes, each returning its
+    edges sorted and de-duplicated so that merging them stays in numpy.
+    """
+    import numpy as np
+
+    workers = workers or os.cpu_count() or 1
+    with open(filename, "rb") as f:
+        header = f.readline()
+        columns = next(csv.reader([header.decode("utf-8-sig")]))
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+
+        # Several chunks per worker evens out the load
+        chunks = workers * 4 if workers > 1 else 1
+        bounds = [start]
+        for i in range(1, chunks):
+            f.seek(max(start + (size - start) * i // chunks, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    ranges = [
+        (filename, bounds[i], bounds[i + 1])
+        for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]
+    ]
+
+    initargs = (
+        person_index, movie_index,
+        columns.index("person_id"), columns.index("movie_id")
+    )
+    if workers == 1:
+        _init_stars_worker(*initargs)
+        parts = [_parse_stars_chunk(chunk) for chunk in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_stars_worker,
+                                 initargs=initargs) as pool:
+            parts = list(pool.map(_parse_stars_chunk, ranges))
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return _distinct(np.concatenate(parts))
+
+
+# Lookup tables for the stars.csv parser, set in each worker process
+_stars_worker = None
+
+
+def _init_stars_worker(person_index, movie_index, person_column, movie_column):
+    global _stars_worker
+    _stars_worker = (person_index, movie_index, person_column, movie_column)
+
+
+def _parse_stars_chunk(chunk):
+    """
+    Parses the byte range `chunk` = (filename, start, end) of a stars CSV
+    file into a sorted numpy array of distinct encoded (person, movie)
+    edges.
+    """
+    import numpy as np
+
+    filename, start, end = chunk
+    person_index, movie_index, person_column, movie_column = _stars_worker
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    width = len(movie_index)
+    needed = max(person_column, movie_column)
+    edges = []
+    for row in csv.reader(data.decode("utf-8").splitlines()):
+        if len(row) <= needed:
+            continue
+        person = person_index.get(row[person_column])
+        movie = movie_index.get(row[movie_column])
+        if person is not None and movie is not None:
+            edges.append(person * width + movie)
+    return _distinct(np.array(edges, dtype=np.int64))
+
+
+def _distinct(values):
+    """
+    Returns the distinct values of a numpy array in sorted order.
+    """
+    import numpy as np
+
+    values = np.sort(values)
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def _csr(rows, sources, targets):
+    """
+    Returns (offsets, indices) arrays grouping `targets` by `sources`.
+    Each row keeps the order in which its targets appear.
+    """
+    import numpy as np
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.intc)
+    offsets = np.zeros(rows + 1, dtype=np.intc)
+    np.cumsum(np.bincount(sources, minlength=rows), out=offsets[1:])
+    indices = targets[np.argsort(sources, kind="stable")]
+    return _int_array(offsets), _int_array(indices)
+
+
+def _int_array(values):
+    """
+    Returns a numpy integer array as an array("i"), which is much faster
+    to index from Python one element at a time.
+    """
+    import numpy as np
+
+    result = array("i")
+    result.frombytes(np.ascontiguousarray(values, dtype=np.intc).tobytes())
+    return result
+
+
+class PathCache():
+    """
+    Least-recently-used cache of solved paths, keyed on (source, target).
+
+    Paths are undirected, so a cached answer for (target, source) is
+    reversed rather than searched for again. A capacity of 0 disables
+    the cache.
+    """
+
+    def __init__(self, capacity=PATH_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, target):
+        """
+        Returns (True, path) for a cached pair, or (False, None).
+        """
+        if (source, target) in self.entries:
+            self.entries.move_to_end((source, target))
+            self.hits += 1
+            return True, self.entries[source, target]
+        if (target, source) in self.entries:
+            self.entries.move_to_end((target, source))
+            self.hits += 1
+            path = self.entries[target, source]
+            return True, None if path is None else _reverse_path(target, path)
+        self.misses += 1
+        return False, None
+
+    def put(self, source, target, path):
+        if self.capacity <= 0:
+            return
+        self.entries[source, target] = path
+        self.entries.move_to_end((source, target))
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+path_cache = PathCache()
+
+
+class LandmarkIndex():
+    """
+    Breadth-first distances from a few high-degree landmark people,
+    plus a connected-component id for every person in a `Graph`.
+
+    For any two people `s` and `t` and landmark `L`, the triangle
+    inequality gives |d(L, s) - d(L, t)| <= d(s, t) <= d(L, s) + d(L, t).
+    Distances are stored as 32-bit ints, with -1 for unreachable.
+    """
+
+    UNREACHABLE = -1
+
+    def __init__(self, graph, people, components, distances):
+        self.graph = graph
+        self.people = people
+        self.components = components
+        self.distances = distances
+        size = len(graph.person_ids)
+        self.rows = [
+            distances[k * size:(k + 1) * size] for k in range(len(people))
+        ]
+        self._snapshot = None
+
+    @classmethod
+    def build(cls, graph, count=LANDMARK_COUNT):
+        """
+        Picks the `count` people with the most movies as landmarks and
+        runs one breadth-first search from each.
+        """
+        size = len(graph.person_ids)
+        people = sorted(
+            range(size), key=graph.movie_count, reverse=True
+        )[:count]
+        distances = array("i")
+        for person in people:
+            distances += _distances(graph, person)
+        return cls(graph, array("i", people), _components(graph), distances)
+
+    def save(self, filename, key):
+        _write_snapshot(filename, key, {
+            "people": (bytes(self.people), "i"),
+            "components": (bytes(self.components), "i"),
+            "distances": (bytes(self.distances), "i")
+        })
+
+    @classmethod
+    def load(cls, graph, filename, key):
+        """
+        Memory-map an index written by `save`, or return None if it is
+        missing or stale.
+        """
+        loaded = _read_snapshot(filename, key)
+        if loaded is None:
+            return None
+        snapshot, sections = loaded
+        index = cls(
+            graph, sections["people"], sections["components"],
+            sections["distances"]
+        )
+        index._snapshot = snapshot
+        return index
+
+    def shortest_path(self, source, target, prune=False):
+        """
+        Returns the shortest list of (movie, person) index pairs from
+        `source` to `target`, or None if they are not connected.
+
+        People in different components are answered without searching.
+        Otherwise the best landmark gives an upper bound and a path that
+        meets it, and a bidirectional search capped below that bound only
+        has to look for something strictly shorter. If `prune` is True,
+        the search also skips people whose landmark lower bound rules
+        them out, which pays off only when the bounds are tight.
+        """
+        if source == target:
+            return []
+        if self.components[source] != self.components[target]:
+            return None
+
+        unreachable = self.UNREACHABLE
+        rows = [
+            row for row in self.rows
+            if row[source] != unreachable and row[target] != unreachable
+        ]
+        if not rows:
+            return bidirectional_search(source, target, self.graph.neighbors)
+
+        best = min(rows, key=lambda row: row[source] + row[target])
+        upper = best[source] + best[target]
+        lower = max(abs(row[source] - row[target]) for row in rows)
+        if lower < upper:
+            to_target = [row[target] for row in rows]
+            to_source = [row[source] for row in rows]
+
+            def bound(person, forward):
+                ends = to_target if forward else to_source
+                return max(
+                    abs(row[person] - end) for row, end in zip(rows, ends)
+                )
+
+            path = bidirectional_search(
+                source, target, self.graph.neighbors,
+                max_length=upper - 1, bound=bound if prune else None
+            )
+            if path is not None:
+                return path
+
+        # Nothing shorter exists, so go through the landmark
+        down = self._descend(source, best)
+        up = self._descend(target, best)
+        if down is None or up is None:
+            return bidirectional_search(source, target, self.graph.neighbors)
+        return down + _reverse_path(target, up)
+
+    def _descend(self, person, row):
+        """
+        Returns a shortest path from `person` to the landmark of `row` by
+        repeatedly stepping to a co-star one step closer to it, or None
+        if some step has no such co-star (the row does not match the
+        graph).
+        """
+        path = []
+        while row[person] != 0:
+            distance = row[person]
+            for movie, neighbor in self.graph.neighbors(person):
+                if row[neighbor] == distance - 1:
+                    path.append((movie, neighbor))
+                    person = neighbor
+                    break
+            else:
+                return None
+        return path
+
+
+def _reverse_path(start, path):
+    """
+    Returns the path walked backwards, given the person it started from.
+    """
+    people = [start] + [person for _, person in path]
+    return [
+        (path[i][0], people[i]) for i in range(len(path) - 1, -1, -1)
+    ]
+
+
+def _distances(graph, source):
+    """
+    Returns an array of breadth-first distances from `source` to every
+    person, with -1 for people who cannot be reached.
+    """
+    person_offsets = graph.person_offsets
+    person_movies = graph.person_movies
+    movie_offsets = graph.movie_offsets
+    movie_stars = graph.movie_stars
+    distances = array("i", [-1]) * len(graph.person_ids)
+    expanded = bytearray(len(graph.movie_ids))
+    distances[source] = 0
+    frontier = [source]
+    level = 0
+    while frontier:
+        level += 1
+        next_frontier = []
+        for person in frontier:
+            for i in range(person_offsets[person], person_offsets[person + 1]):
+                movie = person_movies[i]
+                if expanded[movie]:
+                    continue
+                expanded[movie] = 1
+                for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                    star = movie_stars[j]
+                    if distances[star] == -1:
+                        distances[star] = level
+                        next_frontier.append(star)
+        frontier = next_frontier
+    return distances
+
+
+def _components(graph):
+    """
+    Returns an array giving each person the id of their connected component.
+    """
+    person_offsets = graph.person_offsets
+    person_movies = graph.person_movies
+    movie_offsets = graph.movie_offsets
+    movie_stars = graph.movie_stars
+    components = array("i", [-1]) * len(graph.person_ids)
+    expanded = bytearray(len(graph.movie_ids))
+    component = 0
+    for start in range(len(graph.person_ids)):
+        if components[start] != -1:
+            continue
+        components[start] = component
+        frontier = [start]
+        while frontier:
+            person = frontier.pop()
+            for i in range(person_offsets[person], person_offsets[person + 1]):
+                movie = person_movies[i]
+                if expanded[movie]:
+                    continue
+                expanded[movie] = 1
+                for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                    star = movie_stars[j]
+                    if components[star] == -1:
+                        components[star] = component
+                        frontier.append(star)
+        component += 1
+    return components
+
+
+def load_landmarks(directory, count=LANDMARK_COUNT, build=True):
+    """
+    Loads the landmark index for the compact `graph` from `directory`,
+    building and saving it first if `build` is True and it is missing
+    or stale. Returns None if there is no index to use.
+    """
+    global landmarks
+    filenames = _snapshot_files(directory, LANDMARKS_NAME)
+    key = [_snapshot_key(directory), count]
+    for filename in filenames:
+        landmarks = LandmarkIndex.load(graph, filename, key)
+        if landmarks is not None:
+            break
+    if landmarks is None and build:
+        landmarks = LandmarkIndex.build(graph, count)
+        _save_snapshot(landmarks.save, filenames, key)
+    path_cache.clear()
+    return landmarks
+
+
+def load_data(directory, compact=False, snapshot=True, workers=None):
     """
     Load data from CSV files into memory.
+
+    If `compact` is True, load the integer-indexed `graph` instead
+    of the `names`, `people` and `movies` dictionaries, going through
+    the binary snapshot cache unless `snapshot` is False and parsing
+    with `workers` processes if there is no usable snapshot.
     """
+    global graph, landmarks, name_index
+    path_cache.clear()
+    landmarks = None
+    name_index = None
+    if compact:
+        graph = load_graph(directory, snapshot, workers)
+        return
+
+    # Replace whatever was loaded before, including a compact graph
+    graph = None
+    names.clear()
+    people.clear()
+    movies.clear()
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -53,13 +874,67 @@ def load_data(directory):
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        if len(sys.argv) > 3:
+            sys.exit("Usage: python degrees.py --benchmark [directory]")
+        directory = sys.argv[2] if len(sys.argv) == 3 else "large"
+        print("Loading data...")
+        load_data(directory)
+        print("Data loaded.")
+        benchmark_search()
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark-load":
+        if len(sys.argv) > 3:
+            sys.exit("Usage: python degrees.py --benchmark-load [directory]")
+        directory = sys.argv[2] if len(sys.argv) == 3 else "large"
+        benchmark_loading(directory)
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--landmarks":
+        if len(sys.argv) > 4:
+            sys.exit("Usage: python degrees.py --landmarks [directory] [count]")
+        directory = sys.argv[2] if len(sys.argv) >= 3 else "large"
+        count = int(sys.argv[3]) if len(sys.argv) == 4 else LANDMARK_COUNT
+        print("Loading data...")
+        load_data(directory, compact=True)
+        print("Data loaded.")
+        index = load_landmarks(directory, count)
+        components = len(set(index.components))
+        print(f"{len(index.people)} landmarks, {components} components.")
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        if len(sys.argv) not in [3, 4]:
+            sys.exit("Usage: python degrees.py --batch pairs.tsv [directory]")
+        directory = sys.argv[3] if len(sys.argv) == 4 else "large"
+        print("Loading data...", file=sys.stderr)
+        load_data(directory, compact=True)
+        load_landmarks(directory, build=False)
+        print("Data loaded.", file=sys.stderr)
+        with open(sys.argv[2], encoding="utf-8") as f:
+            batch_queries(f, sys.stdout)
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        if len(sys.argv) > 4:
+            sys.exit("Usage: python degrees.py --serve [directory] [port]")
+        directory = sys.argv[2] if len(sys.argv) >= 3 else "large"
+        port = int(sys.argv[3]) if len(sys.argv) == 4 else 8000
+        print("Loading data...")
+        load_data(directory, compact=True)
+        load_landmarks(directory, build=False)
+        print("Data loaded.")
+        asyncio.run(serve(directory, port=port))
+        return
+
     if len(sys.argv) > 2:
         sys.exit("Usage: python degrees.py [directory]")
     directory = sys.argv[1] if len(sys.argv) == 2 else "large"
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(directory, compact=True)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +944,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, bidirectional=True)
 
     if path is None:
         print("Not connected.")
@@ -78,61 +953,647 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = person_details(path[i][1])["name"]
+            person2 = person_details(path[i + 1][1])["name"]
+            movie = movie_title(path[i + 1][0])
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, bidirectional=False):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
+    If `bidirectional` is True, searches from both ends at once
+    (see `bidirectional_search`), using the landmark index if one is
+    loaded and remembering answers in `path_cache`. Works against the
+    compact `graph` when one has been loaded.
+
     If no possible path, returns None.
     """
-    Stack = QueueFrontier() ## Start with a frontier containing initial state
-    origin = Node(source,None,None)
-    Stack.add(origin)
-    explored = []  ## Creaty empty explored set 
-    while Stack.empty!=False:
-        node = Stack.remove() ##Remove node from frontier
-        explored.append((node.action,node.state))  ##Add to explored
-        if(node.state == origin.state):
-            explored = explored[-1:]
-        if(node.state == target): ##Check whether it is the goal
-            i = 0
-            while i<len(explored)-1:
-                if explored[i][0] == explored[i+1][0]:
-                    del explored[i+1]
-                    i -=1
-                i+=1
-
-            print (explored[1:])
-            return explored[1:]
-        set = neighbors_for_person(node.state) ##Expand node, add to Frontier
-        for s in set:
-            node2 = Node(s[1],node.state,s[0])
-            if Stack.contains_state(node2.state) == False:
-                Stack.add(node2)
-            
+    if bidirectional:
+        cached, path = path_cache.get(source, target)
+        if cached:
+            return None if path is None else list(path)
+        if landmarks is not None:
+            path = landmarks.shortest_path(_node(source), _node(target))
+        else:
+            path = bidirectional_search(
+                _node(source), _node(target), _neighbors()
+            )
+        path = None if path is None else _path_ids(path)
+        path_cache.put(source, target, path)
+        return None if path is None else list(path)
+
+    frontier = QueueFrontier()
+    frontier.add(Node(source, None, None))
+    expanded = set()
+    while not frontier.empty():
+        node = frontier.remove()
+        if node.state in expanded:
+            continue
+        expanded.add(node.state)
+        if node.state == target:
+
+            # Follow the parent pointers back to the source
+            path = []
+            while node.parent is not None:
+                path.append((node.action, node.state))
+                node = node.parent
+            path.reverse()
+            return path
+        for movie_id, person_id in neighbors_for_person(node.state):
+            if (person_id not in expanded and
+                    not frontier.contains_state(person_id)):
+                frontier.add(Node(person_id, node, movie_id))
+
     return None
-    # TODO
-    raise NotImplementedError
 
 
-def person_id_for_name(name):
+def bidirectional_search(source, target, neighbors, max_length=None,
+                         bound=None):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, or None if there is none.
+
+    Runs breadth-first search from the source and the target at the same
+    time, always expanding one whole level of the smaller frontier, and
+    stops at the level where the two searches meet. `neighbors` is called
+    with a person and a set of movies already expanded on that side,
+    and must return (movie, person) pairs through the other movies.
+
+    If `max_length` is given, only paths up to that length are looked for.
+    `bound(person, forward)` may then return a lower bound on the distance
+    from `person` to the target (forward) or to the source (backward),
+    and people that cannot lie on a short enough path are not expanded.
+    """
+    if source == target:
+        return []
+
+    # Maps each reached person to (movie, person) one step closer to
+    # the source (forward) or to the target (backward)
+    forward = {source: None}
+    backward = {target: None}
+    forward_depth = {source: 0}
+    backward_depth = {target: 0}
+    forward_frontier = [source]
+    backward_frontier = [target]
+
+    # A movie expanded once on a side cannot lead anywhere new for that side
+    forward_movies = set()
+    backward_movies = set()
+    forward_level = 0
+    backward_level = 0
+
+    while forward_frontier and backward_frontier:
+
+        # Any meeting from here on is at least one step longer than
+        # the two searches are deep
+        if max_length is not None and forward_level + backward_level >= max_length:
+            return None
+
+        # Grow whichever side currently has less work to do
+        is_forward = len(forward_frontier) <= len(backward_frontier)
+        if is_forward:
+            frontier, parents, depth = forward_frontier, forward, forward_depth
+            other, other_depth = backward, backward_depth
+            expanded = forward_movies
+            forward_level += 1
+            level = forward_level
+        else:
+            frontier, parents, depth = backward_frontier, backward, backward_depth
+            other, other_depth = forward, forward_depth
+            expanded = backward_movies
+            backward_level += 1
+            level = backward_level
+
+        next_frontier = []
+        meeting = None
+        best = None
+        for person in frontier:
+            for movie, neighbor in neighbors(person, expanded):
+                if neighbor in parents:
+                    continue
+                if (bound is not None and
+                        level + bound(neighbor, is_forward) > max_length):
+                    continue
+                parents[neighbor] = (movie, person)
+                depth[neighbor] = level
+                next_frontier.append(neighbor)
+                if neighbor in other:
+                    length = depth[neighbor] + other_depth[neighbor]
+                    if best is None or length < best:
+                        best = length
+                        meeting = neighbor
+
+        if meeting is not None:
+            return _join_paths(meeting, forward, backward)
+
+        if is_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return None
+
+
+def _join_paths(meeting, forward, backward):
+    """
+    Builds the (movie_id, person_id) path through `meeting` from the
+    parent maps of a bidirectional search.
+    """
+    path = []
+    person = meeting
+    while forward[person] is not None:
+        movie, previous = forward[person]
+        path.append((movie, person))
+        person = previous
+    path.reverse()
+
+    person = meeting
+    while backward[person] is not None:
+        movie, following = backward[person]
+        path.append((movie, following))
+        person = following
+    return path
+
+
+def _node(person_id):
+    """
+    Returns the search node for a person in the loaded backend.
+    """
+    return graph.person_index[person_id] if graph is not None else person_id
+
+
+def _neighbors():
+    """
+    Returns the neighbor function of the loaded backend.
+    """
+    return graph.neighbors if graph is not None else neighbors_for_person
+
+
+def _path_ids(path):
+    """
+    Converts a path of search nodes back to (movie_id, person_id) pairs.
+    """
+    if graph is None:
+        return path
+    return [
+        (graph.movie_ids[movie], graph.person_ids[person])
+        for movie, person in path
+    ]
+
+
+def single_source_paths(source, targets, neighbors):
+    """
+    Runs one breadth-first search from `source` and returns a dictionary
+    mapping each reachable person in `targets` to its shortest list of
+    (movie, person) pairs. The search stops once every target is found.
+    `neighbors` is called as in `bidirectional_search`.
+    """
+    parents = {source: None}
+    remaining = set(targets) - {source}
+    frontier = [source]
+    expanded = set()
+    while frontier and remaining:
+        next_frontier = []
+        for person in frontier:
+            for movie, neighbor in neighbors(person, expanded):
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = (movie, person)
+                next_frontier.append(neighbor)
+                remaining.discard(neighbor)
+        frontier = next_frontier
+
+    paths = {}
+    for target in targets:
+        if target not in parents:
+            continue
+        path = []
+        person = target
+        while parents[person] is not None:
+            movie, previous = parents[person]
+            path.append((movie, person))
+            person = previous
+        path.reverse()
+        paths[target] = path
+    return paths
+
+
+def resolve_person(query):
+    """
+    Returns the IMDB id for `query`, which may be an id or a name,
+    without asking for input. Ambiguous names resolve to the best-ranked
+    person. Returns None if it is unknown.
+    """
+    if graph is not None:
+        if query in graph.person_index:
+            return query
+    elif query in people:
+        return query
+    return person_id_for_name(query, interactive=False)
+
+
+def batch_queries(lines, out, chunk=BATCH_CHUNK):
+    """
+    Answers every tab-separated "source<TAB>target" pair in `lines`
+    (names or IMDB ids) and writes one JSON object per pair to `out`.
+
+    Lines are read `chunk` queries at a time. Within a chunk, queries
+    are grouped by source so that one breadth-first search tree answers
+    every target asked of that source; sources with a single target use
+    `bidirectional_search` instead. Each chunk's answers are written and
+    flushed before the next chunk is read, so memory stays bounded and
+    an interrupted run keeps what it has answered. Pairs that cannot be
+    resolved are reported as soon as they are read. Throughput is
+    printed to standard error at the end.
+    """
+    start = time.perf_counter()
+    neighbors = _neighbors()
+
+    # Group the queries of a chunk by resolved source, keeping input
+    # order per source
+    by_source = {}
+    pending = 0
+    count = 0
+    sources = 0
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        fields = line.split("\t")
+        if len(fields) != 2:
+            out.write(json.dumps({"query": line, "error": "malformed line"}) + "\n")
+            continue
+        count += 1
+        source, target = resolve_person(fields[0]), resolve_person(fields[1])
+        if source is None or target is None:
+            out.write(json.dumps({
+                "source": fields[0], "target": fields[1],
+                "error": "person not found"
+            }) + "\n")
+            continue
+        by_source.setdefault(source, []).append(target)
+        pending += 1
+        if pending >= chunk:
+            sources += len(by_source)
+            _answer_batch(by_source, neighbors, out)
+            by_source = {}
+            pending = 0
+    sources += len(by_source)
+    _answer_batch(by_source, neighbors, out)
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"{count} queries from {sources} sources in "
+          f"{elapsed:.3f}s ({rate:.1f} queries/sec)", file=sys.stderr)
+
+
+def _answer_batch(by_source, neighbors, out):
+    """
+    Writes the answers for `by_source`, a dictionary mapping each
+    source to its list of targets, to `out` and flushes it.
+    """
+    for source, targets in by_source.items():
+
+        # Targets in another component are known to be unreachable, and
+        # leaving them out lets the search tree stop early
+        if landmarks is not None:
+            component = landmarks.components[_node(source)]
+            reachable = [
+                target for target in targets
+                if landmarks.components[_node(target)] == component
+            ]
+        else:
+            reachable = targets
+
+        # A lone target is cheaper to meet in the middle than to reach
+        # with a whole search tree
+        if len(set(reachable)) == 1:
+            path = bidirectional_search(
+                _node(source), _node(reachable[0]), neighbors
+            )
+            paths = {} if path is None else {_node(reachable[0]): path}
+        elif reachable:
+            paths = single_source_paths(
+                _node(source), [_node(target) for target in reachable],
+                neighbors
+            )
+        else:
+            paths = {}
+        for target in targets:
+            path = paths.get(_node(target))
+            result = {"source": source, "target": target}
+            if path is None:
+                result["degrees"] = None
+                result["path"] = None
+            else:
+                result["degrees"] = len(path)
+                result["path"] = [list(step) for step in _path_ids(path)]
+            out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+class ServerStats():
+    """
+    Request counts and a window of recent latencies for the query server.
+    """
+
+    def __init__(self, window=10000):
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds, error=False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.latencies.append(seconds * 1000)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        percentiles = {}
+        for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            if latencies:
+                rank = min(len(latencies) - 1, int(fraction * len(latencies)))
+                percentiles[label] = round(latencies[rank], 3)
+            else:
+                percentiles[label] = None
+        percentiles["max"] = round(latencies[-1], 3) if latencies else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": percentiles
+        }
+
+
+def _load_worker(directory):
+    """
+    Loads the graph in a worker process of the query server.
+
+    The server has already loaded the graph, so this normally maps the
+    snapshot it wrote. If no snapshot could be written anywhere, the CSV
+    files are parsed here without starting another process pool.
+    """
+    load_data(directory, compact=True, workers=1)
+    load_landmarks(directory, build=False)
+    _warm_indices()
+
+
+def _warm_indices():
+    """
+    Builds the lazy lookup indices of the loaded graph so that the
+    first query does not pay for them.
+    """
+    if graph is not None:
+        graph.person_index
+        graph.movie_index
+
+
+def _path_result(source, target):
+    """
+    Returns the JSON-ready answer for a path query, run in a worker.
+    """
+    path = shortest_path(source, target, bidirectional=True)
+    if path is None:
+        return {"source": source, "target": target, "degrees": None,
+                "path": None}
+    return {
+        "source": source,
+        "target": target,
+        "degrees": len(path),
+        "path": [
+            {"movie_id": movie_id, "title": movie_title(movie_id),
+             "person_id": person_id,
+             "name": person_details(person_id)["name"]}
+            for movie_id, person_id in path
+        ]
+    }
+
+
+def _people_result(name):
+    """
+    Returns the JSON-ready answer for a name lookup.
+    """
+    return {
+        "name": name,
+        "people": [
+            {"person_id": person_id, **person_details(person_id)}
+            for person_id in get_name_index().exact(name)
+        ]
+    }
+
+
+def _search_result(query, limit):
+    """
+    Returns the JSON-ready answer for an autocomplete or fuzzy search.
+    """
+    return {
+        "query": query,
+        "people": [
+            {"person_id": person_id, **person_details(person_id)}
+            for person_id in get_name_index().search(query, limit)
+        ]
+    }
+
+
+async def serve(directory, host="127.0.0.1", port=8000, workers=None):
+    """
+    Serves JSON answers over HTTP from the graph already in memory.
+
+        GET /person?name=...           people with that name
+        GET /search?q=...&limit=...    autocomplete and fuzzy name search
+        GET /path?source=...&target=...  shortest path (names or ids)
+        GET /stats                     request counts and latency percentiles
+
+    Path searches run in a pool of worker processes, each of which
+    maps the graph snapshot written when the server loaded `directory`
+    (in SNAPSHOT_CACHE if `directory` is read-only), so one slow search
+    does not hold up other requests.
+    """
+    _warm_indices()
+    get_name_index().build()
+    stats = ServerStats()
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(
+        max_workers=workers, initializer=_load_worker, initargs=(directory,)
+    )
+
+    # Start every worker now rather than on the first requests
+    await asyncio.gather(*(
+        loop.run_in_executor(pool, _warm_indices) for _ in range(workers)
+    ))
+
+    async def answer(route, query):
+        if route == "/stats":
+            return 200, stats.summary()
+        if route == "/person":
+            name = query.get("name", [""])[0]
+            return 200, _people_result(name)
+        if route == "/search":
+            text = query.get("q", [""])[0]
+            try:
+                limit = int(query.get("limit", ["10"])[0])
+            except ValueError:
+                return 400, {"error": "limit must be an integer"}
+            if limit < 1:
+                return 400, {"error": "limit must be positive"}
+            return 200, _search_result(text, limit)
+        if route == "/path":
+            source = resolve_person(query.get("source", [""])[0])
+            target = resolve_person(query.get("target", [""])[0])
+            if source is None or target is None:
+                return 404, {"error": "person not found"}
+            result = await loop.run_in_executor(
+                pool, _path_result, source, target
+            )
+            return 200, result
+        return 404, {"error": "unknown route"}
+
+    async def handle(reader, writer):
+        start = time.perf_counter()
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) < 2 or parts[0] != "GET":
+                status, body = 400, {"error": "bad request"}
+            else:
+                url = urlsplit(parts[1])
+                status, body = await answer(url.path, parse_qs(url.query))
+        except Exception as error:
+            status, body = 500, {"error": str(error)}
+
+        payload = json.dumps(body).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                  500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        stats.record(time.perf_counter() - start, error=status >= 400)
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def benchmark_search(pairs=100, seed=0):
+    """
+    Times the one-sided and bidirectional searches on the same
+    random pairs of people and prints a summary, then checks that
+    every path is made of real co-star steps and that both searches
+    agree on every pair's degrees of separation.
+    """
+    rng = random.Random(seed)
+    population = list(graph.person_ids) if graph is not None else sorted(people)
+    queries = [
+        (rng.choice(population), rng.choice(population))
+        for _ in range(pairs)
+    ]
+
+    results = {}
+    for label, bidirectional in (("bfs", False), ("bidirectional", True)):
+        paths = []
+        path_cache.clear()
+        start = time.perf_counter()
+        for source, target in queries:
+            paths.append(
+                shortest_path(source, target, bidirectional=bidirectional)
+            )
+        elapsed = time.perf_counter() - start
+        results[label] = paths
+        print(f"{label}: {pairs} queries in {elapsed:.3f}s "
+              f"({elapsed / pairs * 1000:.2f} ms/query)")
+
+        invalid = sum(
+            path is not None and not valid_path(source, target, path)
+            for (source, target), path in zip(queries, paths)
+        )
+        if invalid:
+            print(f"WARNING: {label} returned {invalid} invalid paths")
+
+    mismatches = [
+        (source, target)
+        for (source, target), bfs, bidirectional in zip(
+            queries, results["bfs"], results["bidirectional"]
+        )
+        if (bfs is None) != (bidirectional is None) or
+        (bfs is not None and len(bfs) != len(bidirectional))
+    ]
+    for source, target in mismatches:
+        print(f"WARNING: searches disagree on {source} -> {target}")
+    connected = sum(path is not None for path in results["bidirectional"])
+    print(f"{connected} of {pairs} pairs connected, "
+          f"{len(mismatches)} length mismatches")
+
+
+def valid_path(source, target, path):
+    """
+    Returns True if `path` is a list of (movie_id, person_id) pairs
+    leading from `source` to `target`, each person having starred in
+    that movie with the person before.
+    """
+    person = source
+    for movie_id, person_id in path:
+        if (movie_id, person_id) not in neighbors_for_person(person):
+            return False
+        person = person_id
+    return person == target
+
+
+def benchmark_loading(directory, worker_counts=None):
+    """
+    Times loading `directory` into the dictionaries, then into the
+    compact graph with stars.csv parsed by different numbers of workers.
+    """
+    start = time.perf_counter()
+    load_data(directory)
+    print(f"dictionaries: {time.perf_counter() - start:.3f}s")
+    names.clear()
+    people.clear()
+    movies.clear()
+
+    if worker_counts is None:
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({1, cores} | {n for n in (2, 4, 8) if n < cores})
+    for workers in worker_counts:
+        start = time.perf_counter()
+        Graph.from_csv(directory, workers)
+        print(f"compact graph, {workers} workers: "
+              f"{time.perf_counter() - start:.3f}s")
+
+
+def person_id_for_name(name, interactive=True):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    If `interactive` is False, an ambiguous name resolves to the
+    best-ranked person (see `NameIndex`) instead of asking.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    person_ids = get_name_index().exact(name)
     if len(person_ids) == 0:
         return None
+    elif len(person_ids) > 1 and not interactive:
+        return person_ids[0]
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
-            person = people[person_id]
+            person = person_details(person_id)
             name = person["name"]
             birth = person["birth"]
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
@@ -147,12 +1608,214 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
-def neighbors_for_person(person_id):
+class NameIndex():
+    """
+    Exact, prefix and trigram lookups over every person's lowercased name.
+
+    People sharing a name are ranked by `_person_rank`, and that order
+    is used to resolve ambiguous names without asking. Exact lookups
+    only need a dictionary from names to people, which is built up
+    front; the sorted names and trigram postings behind prefix and
+    fuzzy lookups are built on the first such lookup.
+    """
+
+    def __init__(self, entries, rank):
+        """
+        `entries` yields (name, person_id) pairs, and `rank(person_id)`
+        returns a key that sorts the preferred person first.
+        """
+        self.rank = rank
+        self.names = {}
+        for name, person_id in entries:
+            self.names.setdefault(name.lower(), []).append(person_id)
+        self.keys = None
+
+    def build(self):
+        """
+        Builds the sorted names, popularity order and trigram postings
+        used by `prefix` and `fuzzy`, if they have not been built yet.
+        """
+        if self.keys is not None:
+            return
+
+        # Distinct names in sorted order, each with its people ranked
+        keys = sorted(self.names)
+        self.people = []
+        self.ranks = []
+        for key in keys:
+            ranked = sorted(self.names[key], key=self.rank)
+            self.people.append(ranked)
+            self.ranks.append(self.rank(ranked[0]))
+
+        # Positions of the names in `keys`, best-ranked name first
+        self.order = array("i", sorted(
+            range(len(keys)), key=self.ranks.__getitem__
+        ))
+
+        # Maps each trigram to the sorted indices of names containing it
+        postings = {}
+        for i, key in enumerate(keys):
+            for trigram in _trigrams(key):
+                postings.setdefault(trigram, []).append(i)
+        self.trigrams = {
+            trigram: array("i", keys) for trigram, keys in postings.items()
+        }
+        self.keys = keys
+
+    def exact(self, name, limit=None):
+        """
+        Returns the ranked person ids with exactly this name,
+        at most `limit` of them if given.
+        """
+        people = self.names.get(name.lower(), [])
+        if len(people) > 1:
+            people = sorted(people, key=self.rank)
+        return people[:limit]
+
+    def prefix(self, prefix, limit=10):
+        """
+        Returns up to `limit` person ids whose name starts with `prefix`,
+        best-ranked first.
+
+        The names with the prefix form one range of the sorted names. A
+        small range is ranked with a heap; a large one is found faster
+        by walking every name in popularity order until `limit` of them
+        fall inside the range.
+        """
+        self.build()
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + chr(0x10FFFF), start)
+        if (end - start) * limit <= len(self.keys):
+            matches = heapq.nsmallest(
+                limit, range(start, end), key=self.ranks.__getitem__
+            )
+        else:
+            matches = []
+            for i in self.order:
+                if start <= i < end:
+                    matches.append(i)
+                    if len(matches) == limit:
+                        break
+        return self._people(matches, limit)
+
+    def fuzzy(self, query, limit=10, similarity=0.3, budget=10000):
+        """
+        Returns up to `limit` person ids whose name shares at least
+        `similarity` of the trigrams of the two, closest first.
+
+        Candidates are counted from the rarest trigrams of `query` (at
+        least three, then up to about `budget` postings), and only the most promising are scored
+        exactly, which keeps common trigrams from dominating the cost.
+        """
+        self.build()
+        query = query.lower()
+        wanted = _trigrams(query)
+        postings = sorted(
+            (self.trigrams[trigram] for trigram in wanted
+             if trigram in self.trigrams), key=len
+        )
+
+        counts = Counter()
+        used = 0
+        for n, keys in enumerate(postings):
+            if n >= 3 and used + len(keys) > budget:
+                break
+            counts.update(keys)
+            used += len(keys)
+
+        scored = []
+        for i, _ in counts.most_common(4 * limit):
+            trigrams = _trigrams(self.keys[i])
+            score = len(wanted & trigrams) / len(wanted | trigrams)
+            if score >= similarity:
+                scored.append((-score, self.ranks[i], i))
+        scored.sort()
+        return self._people([i for _, _, i in scored], limit)
+
+    def search(self, query, limit=10):
+        """
+        Returns up to `limit` person ids for `query`: exact matches,
+        then prefix matches, then fuzzy matches.
+        """
+        results = []
+        for lookup in (self.exact, self.prefix, self.fuzzy):
+            if len(results) >= limit:
+                break
+            for person_id in lookup(query, limit):
+                if person_id not in results:
+                    results.append(person_id)
+        return results[:limit]
+
+    def _people(self, keys, limit):
+        results = []
+        for i in keys:
+            for person_id in self.people[i]:
+                results.append(person_id)
+                if len(results) == limit:
+                    return results
+        return results
+
+
+def _trigrams(name):
+    """
+    Returns the set of three-letter slices of a padded name.
+    """
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _person_rank(person_id):
+    """
+    Returns the key that ranks people sharing a name: most movies first,
+    then earliest birth year, with unknown birth years last, then by id.
+    """
+    if graph is not None:
+        person = graph.person_index[person_id]
+        movie_count = graph.movie_count(person)
+        birth = graph.person_births[person]
+    else:
+        movie_count = len(people[person_id]["movies"])
+        birth = people[person_id]["birth"]
+    return (-movie_count, 0 if birth else 1, birth, person_id)
+
+
+def get_name_index():
+    """
+    Returns the `NameIndex` for whichever backend is loaded,
+    building it on first use.
+    """
+    global name_index
+    if name_index is None:
+        if graph is not None:
+            entries = zip(graph.person_names, graph.person_ids)
+        else:
+            entries = (
+                (person["name"], person_id)
+                for person_id, person in people.items()
+            )
+        name_index = NameIndex(entries, _person_rank)
+    return name_index
+
+
+def neighbors_for_person(person_id, expanded_movies=None):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
+
+    If `expanded_movies` is a set, movies already in it are skipped
+    and the movies used are added to it.
     """
+    if graph is not None:
+        return {
+            (graph.movie_ids[movie], graph.person_ids[person])
+            for movie, person in graph.neighbors(graph.person_index[person_id])
+        }
+
     movie_ids = people[person_id]["movies"]
+    if expanded_movies is not None:
+        movie_ids = movie_ids - expanded_movies
+        expanded_movies.update(movie_ids)
     neighbors = set()
     for movie_id in movie_ids:
         for person_id in movies[movie_id]["stars"]:
@@ -160,5 +1823,28 @@ def neighbors_for_person(person_id):
     return neighbors
 
 
+def person_details(person_id):
+    """
+    Returns a dictionary with the name and birth year of a person,
+    from whichever backend is loaded.
+    """
+    if graph is not None:
+        person = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[person],
+            "birth": graph.person_births[person]
+        }
+    return people[person_id]
+
+
+def movie_title(movie_id):
+    """
+    Returns the title of a movie from whichever backend is loaded.
+    """
+    if graph is not None:
+        return graph.movie_titles[graph.movie_index[movie_id]]
+    return movies[movie_id]["title"]
+
+
 if __name__ == "__main__":
     main()
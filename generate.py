@@ -10,11 +10,35 @@ class CrosswordCreator():
         Create new CSP crossword generate.
         """
         self.crossword = crossword
+
+        # Domains are bitsets over the word index: bit k stands for words[k]
+        self.words = sorted(self.crossword.words)
+        self.index = {word: k for k, word in enumerate(self.words)}
+        self.lengths = dict()
+        self.letters = dict()
+        for k, word in enumerate(self.words):
+            bit = 1 << k
+            self.lengths[len(word)] = self.lengths.get(len(word), 0) | bit
+            for position, letter in enumerate(word):
+                masks = self.letters.setdefault(position, dict())
+                masks[letter] = masks.get(letter, 0) | bit
         self.domains = {
-            var: self.crossword.words.copy()
+            var: (1 << len(self.words)) - 1
             for var in self.crossword.variables
         }
 
+    def values(self, domain):
+        """
+        Return the words in bitset `domain`, in word index order.
+        """
+        bits = bin(domain)[:1:-1]
+        words = []
+        k = bits.find("1")
+        while k != -1:
+            words.append(self.words[k])
+            k = bits.find("1", k + 1)
+        return words
+
     def letter_grid(self, assignment):
         """
         Return 2D array representing a given assignment.
@@ -94,49 +118,15 @@ class CrosswordCreator():
         return self.backtrack(dict())
 
     def enforce_node_consistency(self):
-        for var in self.domains.keys():
-            to_remove = set()
-            for word in self.domains[var]:
-                if(var.length != len(word)):
-                    to_remove.add(word)
-                else:
-                    continue
-            for word in to_remove:
-                self.domains[var].remove(word)
-
         """
         Update `self.domains` such that each variable is node-consistent.
         (Remove any values that are inconsistent with a variable's unary
          constraints; in this case, the length of the word.)
         """
-        ##raise NotImplementedError
+        for var in self.domains:
+            self.domains[var] &= self.lengths.get(var.length, 0)
 
     def revise(self, x, y):
-        if self.crossword.overlaps[x,y] == None:
-            return False
-
-        else:
-            revision = False
-            to_remove = set()
-            for word1 in self.domains[x]:
-                possible_value = False
-                for word2 in self.domains[y]:
-                    if word1 == word2:
-                        continue
-                    elif word1[self.crossword.overlaps[x,y][0]] == word2[self.crossword.overlaps[x,y][1]]:
-                        possible_value = True
-                        break
-                    else:
-                        continue
-                if possible_value == False:
-                    to_remove.add(word1)
-                    revision = True
-                else:
-                    continue
-
-            for word in to_remove:
-                self.domains[x].remove(word)
-            return revision
         """
         Make variable `x` arc consistent with variable `y`.
         To do so, remove values from `self.domains[x]` for which there is no
@@ -145,23 +135,29 @@ class CrosswordCreator():
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
         """
-        raise NotImplementedError
-
-    def ac3(self, arcs=None):
-        if arcs==None:
-            for var in self.domains.keys():
-                neighbours = self.crossword.neighbors(var)
-                for var2 in neighbours:
-                    self.revise(var,var2)
-        else:
-            for _var in arcs:
-                self.revise(_var[0],_var[1])
-
-        if None in self.domains.values():
+        overlap = self.crossword.overlaps[x, y]
+        if overlap is None:
             return False
-        else:
-            return True
+        i, j = overlap
+
+        # Words of x with letter c at i are supported by words of y with c
+        # at j, unless the only such word of y is the same word
+        allowed = 0
+        x_masks = self.letters.get(i, dict())
+        for letter, mask in self.letters.get(j, dict()).items():
+            support = self.domains[y] & mask
+            if support and letter in x_masks:
+                if support & (support - 1):
+                    allowed |= x_masks[letter]
+                else:
+                    allowed |= x_masks[letter] & ~support
+        revised = self.domains[x] & allowed
+        if revised == self.domains[x]:
+            return False
+        self.domains[x] = revised
+        return True
 
+    def ac3(self, arcs=None):
         """
         Update `self.domains` such that each variable is arc consistent.
         If `arcs` is None, begin with initial list of all arcs in the problem.
@@ -170,7 +166,21 @@ class CrosswordCreator():
         Return True if arc consistency is enforced and no domains are empty;
         return False if one or more domains end up empty.
         """
-        raise NotImplementedError
+        if arcs is None:
+            arcs = [
+                (x, y)
+                for x in self.domains
+                for y in self.crossword.neighbors(x)
+            ]
+        queue = list(arcs)
+        while queue:
+            x, y = queue.pop()
+            if self.revise(x, y):
+                if not self.domains[x]:
+                    return False
+                for z in self.crossword.neighbors(x) - {y}:
+                    queue.append((z, x))
+        return True
 
     def assignment_complete(self, assignment):
         if assignment.keys() == self.domains.keys():
@@ -215,47 +225,30 @@ class CrosswordCreator():
         raise NotImplementedError
 
     def order_domain_values(self, var, assignment):
-        variables = list(self.crossword.neighbors(var))
-        for var in variables:
-            if var in assignment.keys():
-                variables.remove(var)
-        values = self.domains(var)
-        rule_out = list()
-        for val in values:
-            substract = 0
-            for _var in variables:
-                for value in self.domains[_var]:
-                    if val[self.crossword.overlaps[var,_var][0]] != value[self.crossword.overlaps[var,_var][1]]:
-                        substract+=1
-            rule_out.append(substract)
-                
-        values = list(values)
-        values.sort(key=rule_out)
-        return values
-
         """
         Return a list of values in the domain of `var`, in order by
         the number of values they rule out for neighboring variables.
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
-        raise NotImplementedError
-
-    def select_unassigned_variable(self, assignment : dict):
-        unassigned = list(self.domains.keys() - assignment.keys())
-        choice = unassigned[0]
-        remaining_values = 9999
-        degree = 0
-        for variable in unassigned:
-            if len(self.domains[variable]) < remaining_values:
-                choice = variable
-            elif len(self.domains[variable]) == remaining_values and len(self.crossword.neighbors(variable)) > degree:
-                choice = variable
-            else:
+        # Values ruled out in each neighbor depend only on the shared letter
+        kept = []
+        for neighbor in self.crossword.neighbors(var):
+            if neighbor in assignment:
                 continue
-        return choice
+            i, j = self.crossword.overlaps[var, neighbor]
+            domain = self.domains[neighbor]
+            kept.append((i, {
+                letter: bin(domain & mask).count("1")
+                for letter, mask in self.letters.get(j, dict()).items()
+            }))
 
+        def ruled_out(word):
+            return -sum(counts.get(word[i], 0) for i, counts in kept)
 
+        return sorted(self.values(self.domains[var]), key=ruled_out)
+
+    def select_unassigned_variable(self, assignment):
         """
         Return an unassigned variable not already part of `assignment`.
         Choose the variable with the minimum number of remaining values
@@ -263,24 +256,13 @@ class CrosswordCreator():
         degree. If there is a tie, any of the tied variables are acceptable
         return values.
         """
-        raise NotImplementedError
+        return min(
+            (var for var in self.domains if var not in assignment),
+            key=lambda var: (bin(self.domains[var]).count("1"),
+                             -len(self.crossword.neighbors(var)))
+        )
 
     def backtrack(self, assignment):
-        if self.assignment_complete(assignment) == True:
-            return assignment
-        else:
-            variable = self.select_unassigned_variable(assignment)
-            for value in self.domains[variable]:
-                assignment2 = copy.copy(assignment)
-                assignment2[variable] = value
-                if self.consistent(assignment2) and self.backtrack(assignment2) != None:
-                    return assignment2
-                else:
-                    continue
-            return None
-                    
-
-
         """
         Using Backtracking Search, take as input a partial assignment for the
         crossword and return a complete assignment if possible to do so.
@@ -289,7 +271,36 @@ class CrosswordCreator():
 
         If no assignment is possible, return None.
         """
-        raise NotImplementedError
+        if self.assignment_complete(assignment):
+            return assignment
+        variable = self.select_unassigned_variable(assignment)
+        for value in self.order_domain_values(variable, assignment):
+            assignment2 = copy.copy(assignment)
+            assignment2[variable] = value
+            if not self.consistent(assignment2):
+                continue
+
+            # Forward check: neighbors keep only other words that fit `value`
+            domains = self.domains.copy()
+            bit = 1 << self.index[value]
+            self.domains[variable] = bit
+            fits = True
+            for neighbor in self.crossword.neighbors(variable):
+                if neighbor in assignment2:
+                    continue
+                i, j = self.crossword.overlaps[variable, neighbor]
+                self.domains[neighbor] &= (
+                    self.letters.get(j, dict()).get(value[i], 0) & ~bit
+                )
+                if not self.domains[neighbor]:
+                    fits = False
+                    break
+            if fits:
+                result = self.backtrack(assignment2)
+                if result is not None:
+                    return result
+            self.domains = domains
+        return None
 
 
 def main():
@@ -1,6 +1,12 @@
 import csv
+import glob
+import heapq
 import itertools
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 PROBS = {
 
@@ -36,62 +42,727 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Probability that a parent with 0, 1 or 2 copies passes the gene on
+PASSES = (PROBS["mutation"], 0.5, 1 - PROBS["mutation"])
+
+# INHERITANCE[mother][father][child]: probability of the child's number
+# of copies given their parents'
+INHERITANCE = tuple(
+    tuple(
+        ((1 - PASSES[mother]) * (1 - PASSES[father]),
+         PASSES[mother] * (1 - PASSES[father]) +
+         (1 - PASSES[mother]) * PASSES[father],
+         PASSES[mother] * PASSES[father])
+        for father in range(3)
+    )
+    for mother in range(3)
+)
+
+# GENE_PRIOR[genes] and TRAIT_GIVEN_GENE[genes][trait], as tables
+GENE_PRIOR = tuple(PROBS["gene"][genes] for genes in range(3))
+TRAIT_GIVEN_GENE = tuple(
+    (PROBS["trait"][genes][False], PROBS["trait"][genes][True])
+    for genes in range(3)
+)
+
+# Gene assignments evaluated per NumPy batch when enumerating
+ENUMERATION_CHUNK = 1 << 16
+
+# Likelihood weighting: default sample budget, the cap when sampling to
+# a target standard error, samples drawn per NumPy batch, and the
+# effective sample size below which standard errors are not trusted
+SAMPLES = 100000
+MAX_SAMPLES = 10 ** 7
+SAMPLE_BATCH = 10000
+MIN_EFFECTIVE_SAMPLES = 1000
+
+# Gibbs sampling: independent chains run side by side, and the sweeps
+# each runs before its samples are kept
+GIBBS_CHAINS = 200
+GIBBS_BURN_IN = 100
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    errors = None
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "--batch":
+        workers = int(sys.argv[4]) if len(sys.argv) == 5 else None
+        timings = batch_probabilities(sys.argv[2], sys.argv[3], workers)
+        total = sum(seconds for _, seconds, _ in timings)
+        print(f"{len(timings)} families in {total:.2f}s of inference")
+        slowest = sorted(timings, key=lambda timing: -timing[1])[:5]
+        for path, seconds, error in slowest:
+            print(f"  {path}: {seconds:.3f}s" +
+                  (f" ({error})" if error else ""))
+        return
+    if len(sys.argv) == 3 and sys.argv[1] == "--enumerate":
+        people = load_data(sys.argv[2])
+        probabilities = enumerate_probabilities(people)
+    elif len(sys.argv) == 3 and sys.argv[1] == "--vectorized":
+        people = load_data(sys.argv[2])
+        probabilities = enumerate_vectorized(people)
+    elif len(sys.argv) == 4 and sys.argv[1] in ("--sample", "--gibbs"):
+        people = load_data(sys.argv[3])
+
+        # A budget below 1 is a target standard error instead
+        budget = float(sys.argv[2])
+        samples, target = ((MAX_SAMPLES, budget) if budget < 1 else
+                           (int(budget), None))
+        sample = (sample_probabilities if sys.argv[1] == "--sample" else
+                  gibbs_probabilities)
+        probabilities, errors = sample(people, samples, target_error=target)
+    elif len(sys.argv) == 2:
+        people = load_data(sys.argv[1])
+        probabilities = infer(people)
+    else:
+        sys.exit("Usage: python heredity.py [--enumerate | --vectorized] "
+                 "data.csv\n"
+                 "       python heredity.py --sample | --gibbs "
+                 "samples|stderr data.csv\n"
+                 "       python heredity.py --batch directory|glob "
+                 "results.csv|results.json [workers]")
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if errors is None:
+                    print(f"    {value}: {p:.4f}")
+                else:
+                    error = errors[person][field][value]
+                    print(f"    {value}: {p:.4f} ± {error:.4f}")
+
+
+def enumerate_probabilities(people):
+    """
+    Compute gene and trait distributions for everyone in `people` by
+    summing the joint probability of every assignment consistent with
+    the known traits.
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    Assignments are streamed from `assignments` and only running totals
+    are kept, so memory stays proportional to the number of people.
+    """
+    total = 0
+    ones = dict.fromkeys(people, 0)
+    twos = dict.fromkeys(people, 0)
+    traits = dict.fromkeys(people, 0)
+    for one_gene, two_genes, have_trait in assignments(people):
+        p = joint_probability(people, one_gene, two_genes, have_trait)
+        total += p
+        for person in one_gene:
+            ones[person] += p
+        for person in two_genes:
+            twos[person] += p
+        for person in have_trait:
+            traits[person] += p
+
+    # Ensure probabilities sum to 1
+    return {
         person: {
             "gene": {
-                2: 0,
-                1: 0,
-                0: 0
+                2: twos[person] / total,
+                1: ones[person] / total,
+                0: (total - ones[person] - twos[person]) / total
             },
             "trait": {
-                True: 0,
-                False: 0
+                True: traits[person] / total,
+                False: (total - traits[person]) / total
             }
         }
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
+def assignments(people):
+    """
+    Yield every (one_gene, two_genes, have_trait) consistent with the
+    known traits in `people`, one at a time. Known traits are fixed up
+    front, so only the unknown ones are enumerated. The sets yielded may
+    be shared between assignments and must not be modified.
+    """
+    names = list(people)
+    known = {person for person in names if people[person]["trait"]}
+    unknown = [person for person in names if people[person]["trait"] is None]
+    for genes in itertools.product((0, 1, 2), repeat=len(names)):
+        one_gene = {person for person, n in zip(names, genes) if n == 1}
+        two_genes = {person for person, n in zip(names, genes) if n == 2}
+        for have_trait in subsets(unknown):
+            yield one_gene, two_genes, known | have_trait
+
+
+def infer(people):
+    """
+    Compute gene and trait distributions for everyone in `people`, given
+    the known traits, by exact message passing over a junction tree of
+    the pedigree.
+
+    Each person contributes one factor over their gene and their parents'
+    genes, with a known trait folded in as evidence. Eliminating genes in
+    min-degree order groups these factors into clusters of a junction
+    tree; one pass up and one pass down the tree then leaves every
+    cluster holding the posterior over its genes. For tree-shaped
+    pedigrees the clusters stay small, so the work is linear in the size
+    of the family.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+
+    # P(gene | parents' genes) or P(gene), times P(known trait | gene)
+    factors = []
+    for i, name in enumerate(names):
+        person = people[name]
+        evidence = [
+            1 if person["trait"] is None else
+            PROBS["trait"][genes][person["trait"]]
+            for genes in range(3)
+        ]
+        if person["mother"] is None:
+            factors.append(((i,), {
+                (genes,): PROBS["gene"][genes] * evidence[genes]
+                for genes in range(3)
+            }))
+        else:
+            values = dict()
+            for mother, father in itertools.product(range(3), repeat=2):
+                child = INHERITANCE[mother][father]
+                for genes in range(3):
+                    values[mother, father, genes] = (child[genes] *
+                                                     evidence[genes])
+            scope = (index[person["mother"]], index[person["father"]], i)
+            factors.append((scope, values))
+
+    clusters, parents, position = junction_tree(len(names), factors)
+
+    # Cluster potentials: the product of the factors assigned to each
+    beliefs = [
+        (scope, dict.fromkeys(itertools.product(range(3), repeat=len(scope)),
+                              1))
+        for scope in clusters
+    ]
+    for factor in factors:
+        k = min(position[variable] for variable in factor[0])
+        beliefs[k] = multiply(beliefs[k], factor)
+
+    # Collect towards the roots, in elimination order
+    messages = [None] * len(clusters)
+    for k, parent in enumerate(parents):
+        if parent is not None:
+            messages[k] = scale(marginalize(beliefs[k], clusters[k][1:]))
+            beliefs[parent] = multiply(beliefs[parent], messages[k])
+
+    # Distribute back towards the leaves
+    for k in reversed(range(len(clusters))):
+        parent = parents[k]
+        if parent is not None:
+            message = divide(marginalize(beliefs[parent], clusters[k][1:]),
+                             messages[k])
+            beliefs[k] = multiply(beliefs[k], scale(message))
+
+    probabilities = dict()
+    for i, name in enumerate(names):
+        _, values = scale(marginalize(beliefs[position[i]], (i,)))
+        gene = {genes: values[genes,] for genes in (2, 1, 0)}
+        trait = people[name]["trait"]
+        if trait is None:
+            p = sum(gene[genes] * PROBS["trait"][genes][True]
+                    for genes in gene)
+        else:
+            p = 1 if trait else 0
+        probabilities[name] = {
+            "gene": gene,
+            "trait": {True: p, False: 1 - p}
+        }
+    return probabilities
+
+
+def enumerate_vectorized(people, chunk=ENUMERATION_CHUNK):
+    """
+    Compute gene and trait distributions for everyone in `people` by
+    enumerating every assignment of gene counts, `chunk` at a time, as
+    NumPy arrays. Each joint probability is a product of lookups in
+    GENE_PRIOR, INHERITANCE and TRAIT_GIVEN_GENE; unknown traits are
+    summed out in closed form rather than enumerated.
+    """
+    import numpy as np
+
+    names, mothers, fathers, traits = intern(people)
+    count = len(names)
+    prior = np.array(GENE_PRIOR)
+    inheritance = np.array(INHERITANCE)
+    trait_given_gene = np.array(TRAIT_GIVEN_GENE)
+    powers = 3 ** np.arange(count)
+
+    gene_totals = np.zeros((count, 3))
+    trait_totals = np.zeros(count)
+    for start in range(0, 3 ** count, chunk):
+        codes = np.arange(start, min(start + chunk, 3 ** count))
+        genes = (codes[:, None] // powers % 3).astype(np.int8)
+
+        # Joint probability of each assignment
+        p = np.ones(len(codes))
+        for i in range(count):
+            if mothers[i] < 0:
+                p *= prior[genes[:, i]]
+            else:
+                p *= inheritance[genes[:, mothers[i]], genes[:, fathers[i]],
+                                 genes[:, i]]
+            if traits[i] >= 0:
+                p *= trait_given_gene[genes[:, i], traits[i]]
+
+        for i in range(count):
+            gene_totals[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+            if traits[i] < 0:
+                trait_totals[i] += p @ trait_given_gene[genes[:, i], 1]
+
+    probabilities = dict()
+    for i, name in enumerate(names):
+        total = gene_totals[i].sum()
+        trait = (trait_totals[i] / total if traits[i] < 0 else
+                 float(traits[i]))
+        probabilities[name] = {
+            "gene": {genes: gene_totals[i][genes] / total
+                     for genes in (2, 1, 0)},
+            "trait": {True: trait, False: 1 - trait}
+        }
+    return probabilities
+
+
+def sample_probabilities(people, samples=SAMPLES, target_error=None,
+                         batch=SAMPLE_BATCH, seed=None):
+    """
+    Estimate gene and trait distributions for everyone in `people` by
+    likelihood weighting.
+
+    Genes are sampled parents first, `batch` samples at a time, from
+    GENE_PRIOR and INHERITANCE; each sample is weighted by the
+    probability of the known traits given its genes. An unknown trait is
+    estimated from P(trait | genes) rather than sampled. Sampling stops
+    after `samples` samples, or earlier once every standard error is at
+    most `target_error`.
+
+    With many known traits a few samples carry almost all the weight, so
+    the effective sample size (sum of w) ** 2 / (sum of w ** 2) stays
+    small (see gibbs_probabilities). While it is below
+    MIN_EFFECTIVE_SAMPLES, every standard error is at least
+    0.5 / sqrt(effective sample size), the largest a proportion can
+    have, and `target_error` is never considered met.
+
+    Return a tuple (probabilities, errors), where `errors` has the same
+    shape as `probabilities` and holds the standard error of each value.
+    """
+    import numpy as np
+
+    names, mothers, fathers, traits = intern(people)
+    count = len(names)
+    order = parents_first(mothers, fathers)
+    rng = np.random.default_rng(seed)
+    prior = np.cumsum(GENE_PRIOR)
+    inheritance = np.cumsum(np.array(INHERITANCE), axis=2)
+    trait_given_gene = np.array(TRAIT_GIVEN_GENE)
+    log_evidence = np.log(trait_given_gene)
+
+    # Sums of w, w * f and w ** 2 * f (and w ** 2 * f ** 2 for traits),
+    # all relative to exp(shift) so that weights never underflow
+    shift = -np.inf
+    weight = weight_squared = 0
+    genes_weight = np.zeros((count, 3))
+    genes_squared = np.zeros((count, 3))
+    trait_weight = np.zeros(count)
+    trait_squared = np.zeros(count)
+    trait_fourth = np.zeros(count)
+
+    drawn = 0
+    while drawn < samples:
+        size = min(batch, samples - drawn)
+        genes = np.zeros((size, count), dtype=np.int8)
+        log_weights = np.zeros(size)
+        for i in order:
+            u = rng.random(size)
+            if mothers[i] < 0:
+                genes[:, i] = (u > prior[0]).astype(np.int8) + (u > prior[1])
+            else:
+                cdf = inheritance[genes[:, mothers[i]], genes[:, fathers[i]]]
+                genes[:, i] = (u > cdf[:, 0]).astype(np.int8) + (u > cdf[:, 1])
+            if traits[i] >= 0:
+                log_weights += log_evidence[genes[:, i], traits[i]]
+
+        # Rescale the sums if this batch has a heavier sample
+        top = log_weights.max()
+        if top > shift:
+            factor = np.exp(shift - top)
+            weight *= factor
+            weight_squared *= factor ** 2
+            genes_weight *= factor
+            genes_squared *= factor ** 2
+            trait_weight *= factor
+            trait_squared *= factor ** 2
+            trait_fourth *= factor ** 2
+            shift = top
+        w = np.exp(log_weights - shift)
+        w2 = w * w
+        weight += w.sum()
+        weight_squared += w2.sum()
+        for i in range(count):
+            genes_weight[i] += np.bincount(genes[:, i], weights=w, minlength=3)
+            genes_squared[i] += np.bincount(genes[:, i], weights=w2,
+                                            minlength=3)
+            if traits[i] < 0:
+                f = trait_given_gene[genes[:, i], 1]
+                trait_weight[i] += w @ f
+                trait_squared[i] += w2 @ f
+                trait_fourth[i] += w2 @ (f * f)
+        drawn += size
+
+        # Standard errors of the weighted (ratio) estimates
+        gene_estimates = genes_weight / weight
+        gene_errors = np.sqrt(np.maximum(
+            genes_squared * (1 - 2 * gene_estimates) +
+            gene_estimates ** 2 * weight_squared, 0
+        )) / weight
+        trait_estimates = trait_weight / weight
+        trait_errors = np.sqrt(np.maximum(
+            trait_fourth - 2 * trait_estimates * trait_squared +
+            trait_estimates ** 2 * weight_squared, 0
+        )) / weight
+
+        # Few samples carry the weight: widen the errors, keep sampling
+        effective = weight ** 2 / weight_squared
+        if effective < MIN_EFFECTIVE_SAMPLES:
+            floor = 0.5 / np.sqrt(effective)
+            gene_errors = np.maximum(gene_errors, floor)
+            trait_errors = np.maximum(trait_errors, floor)
+        elif target_error is not None and max(
+            gene_errors.max(), trait_errors.max()
+        ) <= target_error:
+            break
+
+    return _estimates(names, traits, gene_estimates, gene_errors,
+                      trait_estimates, trait_errors)
+
+
+def gibbs_probabilities(people, samples=SAMPLES, target_error=None,
+                        chains=GIBBS_CHAINS, burn_in=GIBBS_BURN_IN,
+                        seed=None):
+    """
+    Estimate gene and trait distributions for everyone in `people` by
+    Gibbs sampling, which unlike likelihood weighting copes with large
+    pedigrees where many traits are known.
+
+    `chains` independent chains start from genes sampled parents first
+    and are advanced together as NumPy arrays: each sweep resamples every
+    person's genes given their parents, children, co-parents and known
+    trait. After `burn_in` sweeps, every sweep adds `chains` samples
+    until `samples` are drawn, or every standard error is at most
+    `target_error`. Standard errors come from the spread of the
+    per-chain averages.
+
+    Return a tuple (probabilities, errors) as sample_probabilities does.
+    """
+    import numpy as np
+
+    names, mothers, fathers, traits = intern(people)
+    count = len(names)
+    rng = np.random.default_rng(seed)
+    log_prior = np.log(GENE_PRIOR)[:, None]
+    log_inheritance = np.log(np.array(INHERITANCE))
+    trait_given_gene = np.array(TRAIT_GIVEN_GENE)
+    log_evidence = np.log(trait_given_gene)
+
+    # Each person's children, with the other parent of each
+    as_mother = [[] for _ in range(count)]
+    as_father = [[] for _ in range(count)]
+    for child in range(count):
+        if mothers[child] >= 0:
+            as_mother[mothers[child]].append((child, fathers[child]))
+            as_father[fathers[child]].append((child, mothers[child]))
+
+    # Start every chain from a sample of the prior
+    genes = np.zeros((count, chains), dtype=np.int8)
+    prior = np.cumsum(GENE_PRIOR)
+    inheritance = np.cumsum(np.array(INHERITANCE), axis=2)
+    for i in parents_first(mothers, fathers):
+        u = rng.random(chains)
+        cdf = (np.broadcast_to(prior, (chains, 3)) if mothers[i] < 0 else
+               inheritance[genes[mothers[i]], genes[fathers[i]]])
+        genes[i] = (u > cdf[:, 0]).astype(np.int8) + (u > cdf[:, 1])
+
+    gene_counts = np.zeros((count, 3, chains))
+    trait_sums = np.zeros((count, chains))
+    sweep = 0
+    sweeps = 0
+    while sweeps * chains < samples:
+        for i in range(count):
+
+            # Log of P(genes of i | everything else), up to a constant
+            if mothers[i] < 0:
+                logits = np.repeat(log_prior, chains, axis=1)
+            else:
+                logits = log_inheritance[genes[mothers[i]],
+                                         genes[fathers[i]]].T.copy()
+            if traits[i] >= 0:
+                logits += log_evidence[:, traits[i]][:, None]
+            for child, father in as_mother[i]:
+                logits += log_inheritance[:, genes[father], genes[child]]
+            for child, mother in as_father[i]:
+                logits += log_inheritance[genes[mother], :, genes[child]].T
+
+            weights = np.exp(logits - logits.max(axis=0))
+            cdf = np.cumsum(weights, axis=0)
+            u = rng.random(chains) * cdf[2]
+            genes[i] = (u > cdf[0]).astype(np.int8) + (u > cdf[1])
+
+        # Keep only the sweeps after the first `burn_in`
+        sweep += 1
+        if sweep <= burn_in:
             continue
+        sweeps += 1
+        for value in range(3):
+            gene_counts[:, value] += genes == value
+        trait_sums += trait_given_gene[genes, 1]
+
+        # Standard errors from the spread of the chain averages
+        if target_error is not None and chains > 1 and sweeps % 10 == 0:
+            spread = max(
+                (gene_counts / sweeps).std(axis=2, ddof=1).max(),
+                (trait_sums / sweeps)[np.array(traits) < 0].std(
+                    axis=1, ddof=1
+                ).max(initial=0)
+            )
+            if spread / np.sqrt(chains) <= target_error:
+                break
+
+    sweeps = max(sweeps, 1)
+    gene_averages = gene_counts / sweeps
+    trait_averages = trait_sums / sweeps
+    ddof = 1 if chains > 1 else 0
+    return _estimates(
+        names, traits,
+        gene_averages.mean(axis=2),
+        gene_averages.std(axis=2, ddof=ddof) / np.sqrt(chains),
+        trait_averages.mean(axis=1),
+        trait_averages.std(axis=1, ddof=ddof) / np.sqrt(chains)
+    )
+
+
+def _estimates(names, traits, gene_estimates, gene_errors, trait_estimates,
+               trait_errors):
+    """
+    Return (probabilities, errors) in the shape main prints from per-person
+    arrays of gene estimates, trait estimates and their standard errors.
+    """
+    probabilities, errors = dict(), dict()
+    for i, name in enumerate(names):
+        if traits[i] >= 0:
+            trait, trait_error = float(traits[i]), 0.0
+        else:
+            trait, trait_error = trait_estimates[i], trait_errors[i]
+        probabilities[name] = {
+            "gene": {genes: gene_estimates[i][genes] for genes in (2, 1, 0)},
+            "trait": {True: trait, False: 1 - trait}
+        }
+        errors[name] = {
+            "gene": {genes: gene_errors[i][genes] for genes in (2, 1, 0)},
+            "trait": {True: trait_error, False: trait_error}
+        }
+    return probabilities, errors
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+def parents_first(mothers, fathers):
+    """
+    Return the numbers of the people in an order where everyone comes
+    after their parents.
+    """
+    order = []
+    placed = [False] * len(mothers)
+    for start in range(len(mothers)):
+        stack = [start]
+        while stack:
+            i = stack[-1]
+            if placed[i]:
+                stack.pop()
+                continue
+            waiting = [parent for parent in (mothers[i], fathers[i])
+                       if parent >= 0 and not placed[parent]]
+            if waiting:
+                stack.extend(waiting)
+            else:
+                placed[i] = True
+                order.append(i)
+                stack.pop()
+    return order
 
-    # Ensure probabilities sum to 1
-    normalize(probabilities)
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+def intern(people):
+    """
+    Number the people in `people` in order.
+
+    Return a tuple (names, mothers, fathers, traits) of lists, where
+    `mothers[i]` and `fathers[i]` are the numbers of person i's parents
+    (-1 if unknown) and `traits[i]` is 1 or 0 if their trait is known,
+    -1 otherwise.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    mothers = [index.get(people[name]["mother"], -1) for name in names]
+    fathers = [index.get(people[name]["father"], -1) for name in names]
+    traits = [
+        -1 if people[name]["trait"] is None else int(people[name]["trait"])
+        for name in names
+    ]
+    return names, mothers, fathers, traits
+
+
+def junction_tree(count, factors):
+    """
+    Eliminate variables 0 .. count - 1 of `factors` in min-degree order.
+
+    Return a tuple (clusters, parents, position): `clusters[k]` is the
+    scope formed when its first variable was eliminated, `parents[k]` the
+    cluster its message goes to (None for a root), and `position[v]` the
+    cluster in which variable `v` was eliminated.
+    """
+    neighbours = [set() for _ in range(count)]
+    for scope, _ in factors:
+        for variable in scope:
+            neighbours[variable].update(scope)
+    for variable in range(count):
+        neighbours[variable].discard(variable)
+
+    clusters = []
+    position = [None] * count
+    heap = [(len(neighbours[v]), v) for v in range(count)]
+    heapq.heapify(heap)
+    while heap:
+        degree, variable = heapq.heappop(heap)
+        if position[variable] is not None:
+            continue
+        if degree != len(neighbours[variable]):
+            continue
+        position[variable] = len(clusters)
+        clusters.append((variable,) + tuple(sorted(neighbours[variable])))
+
+        # Connect the remaining neighbours, which now share a factor
+        for other in neighbours[variable]:
+            neighbours[other].discard(variable)
+            neighbours[other].update(neighbours[variable] - {other})
+            heapq.heappush(heap, (len(neighbours[other]), other))
+
+    parents = [
+        min((position[v] for v in scope[1:]), default=None)
+        for scope in clusters
+    ]
+    return clusters, parents, position
+
+
+def multiply(a, b):
+    """
+    Return the product of factors `a` and `b`. A factor is a tuple
+    (scope, values), where `values` maps each assignment of the scope's
+    variables to a number.
+    """
+    scope = a[0] + tuple(v for v in b[0] if v not in a[0])
+    picks = [scope.index(v) for v in b[0]]
+    values = dict()
+    for assignment in itertools.product(range(3), repeat=len(scope)):
+        values[assignment] = (a[1][assignment[:len(a[0])]] *
+                              b[1][tuple(assignment[i] for i in picks)])
+    return scope, values
+
+
+def marginalize(factor, scope):
+    """
+    Return `factor` summed over every variable not in `scope`.
+    """
+    picks = [factor[0].index(v) for v in scope]
+    values = dict.fromkeys(itertools.product(range(3), repeat=len(scope)), 0)
+    for assignment, p in factor[1].items():
+        values[tuple(assignment[i] for i in picks)] += p
+    return tuple(scope), values
+
+
+def divide(a, b):
+    """
+    Return factor `a` divided by factor `b`, over the same scope, taking
+    0 / 0 to be 0.
+    """
+    return a[0], {
+        assignment: p / b[1][assignment] if b[1][assignment] else 0
+        for assignment, p in a[1].items()
+    }
+
+
+def scale(factor):
+    """
+    Return `factor` scaled to sum to 1, which keeps messages from
+    underflowing in large families.
+    """
+    total = sum(factor[1].values())
+    return factor[0], {
+        assignment: p / total for assignment, p in factor[1].items()
+    }
+
+
+def batch_probabilities(pattern, output, workers=None):
+    """
+    Run `infer` on every family CSV in directory `pattern` (or matching
+    glob `pattern`) across a pool of `workers` processes, and write the
+    results to `output`: JSON if its name ends in .json, CSV otherwise.
+
+    Return a list of (path, seconds, error) with the inference time of
+    each family, and the error that stopped it, if any.
+    """
+    if os.path.isdir(pattern):
+        paths = sorted(glob.glob(os.path.join(pattern, "*.csv")))
+    else:
+        paths = sorted(glob.glob(pattern))
+
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(paths) // (workers * 8))
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(output, "w", newline="") as f:
+        results = pool.map(infer_family, paths, chunksize=chunksize)
+        if output.endswith(".json"):
+            families = dict()
+            for path, probabilities, seconds, error in results:
+                timings.append((path, seconds, error))
+                families[path] = {"seconds": seconds, "error": error,
+                                  "people": probabilities}
+            json.dump(families, f, indent=2)
+        else:
+            writer = csv.writer(f)
+            writer.writerow(["family", "seconds", "error", "name", "gene_2",
+                             "gene_1", "gene_0", "trait"])
+            for path, probabilities, seconds, error in results:
+                timings.append((path, seconds, error))
+                if error:
+                    writer.writerow([path, seconds, error] + [""] * 5)
+                for person, p in (probabilities or dict()).items():
+                    writer.writerow([path, seconds, "", person,
+                                     p["gene"][2], p["gene"][1],
+                                     p["gene"][0], p["trait"][True]])
+    return timings
+
+
+def infer_family(path):
+    """
+    Load and run `infer` on the family in `path`.
+
+    Return a tuple (path, probabilities, seconds, error), where `error`
+    describes a family that could not be read (with probabilities None).
+    """
+    start = time.perf_counter()
+    try:
+        probabilities = infer(load_data(path))
+        error = None
+    except (OSError, KeyError, ValueError) as e:
+        probabilities = None
+        error = f"{type(e).__name__}: {e}"
+    return path, probabilities, time.perf_counter() - start, error
 
 
 def load_data(filename):
@@ -128,103 +799,17 @@ def powerset(s):
     ]
 
 
-def joint_probability(people, one_gene, two_genes, have_trait):
-    p = 1
-    for person in people:   
-        p1 = 1
-        p2 = 1
-        if person in one_gene:
-            if person in have_trait:
-                p2 = PROBS["trait"][1][True]
-            else:
-                p2 = PROBS["trait"][1][False]
-
-            if people[person]["mother"] == None and people[person]["father"] == None:
-                p1 = PROBS["gene"][1]
-            else:
-            ## Both parents 0 genes
-                if (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes) and  (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes):
-                    p1 = 2*PROBS["mutation"]*(1-PROBS["mutation"])
-                ## One parent 1 gene, the other 0
-                elif (people[person]["mother"] in one_gene and (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes)) or (people[person]["father"] in one_gene and (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes)):
-                    p1 = 2*PROBS["mutation"]*0.5*(1-PROBS["mutation"]) + 2*(1-PROBS["mutation"])*0.5*(1-PROBS["mutation"]) 
-                ## Both parents 2 genes
-                elif (people[person]["mother"] in two_genes and people[person]["father"] in two_genes):
-                    p1 = 2*(1-PROBS["mutation"])*PROBS["mutation"]
-                ## One parent 1 gene, the other 2
-                elif(people[person]["mother"] in two_genes and people[person]["father"] in one_gene) or (people[person]["father"] in two_genes and people[person]["mother"] in one_gene):
-                    p1 = PROBS["mutation"]*0.5*PROBS["mutation"] + 2*(1-PROBS["mutation"])*0.5*PROBS["mutation"] 
-                ## Both parents 1 gene
-                elif(people[person]["mother"] in one_gene and people[person]["father"] in one_gene):
-                    p1 = 4*PROBS["mutation"]*0.5*0.5*(1-PROBS["mutation"])
-                ## One parent 2 genes, the other 0 
-                elif(people[person]["mother"] in two_genes and people[person]["father"] not in one_gene and people[person]["father"] not in two_genes) or (people[person]["father"] in two_genes and people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes):
-                    p1 = (1-PROBS["mutation"])*(1-PROBS["mutation"]) + PROBS["mutation"]*PROBS["mutation"]
-            p *=(p1*p2)
-        elif person in two_genes:
-            if person in have_trait:
-                p2 = PROBS["trait"][2][True]
-            else:
-                p2 = PROBS["trait"][2][False]
-
-            if people[person]["mother"] == None and people[person]["father"] == None:
-                p1 =PROBS["gene"][2]
-            else:
-            ## Both parents 0 genes
-                if (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes) and  (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes):
-                    p1 = PROBS["mutation"]**2
-            ## One parent 1 gene, the other 0
-                elif (people[person]["mother"] in one_gene and (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes)) or (people[person]["father"] in one_gene and (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes)):
-                    p1 = 0.5*(1-PROBS["mutation"])*PROBS["mutation"]+ 0.5*PROBS["mutation"]**2
-            ## Both parents 2 genes
-                elif (people[person]["mother"] in two_genes and people[person]["father"] in two_genes):
-                    p1 = (1-PROBS["mutation"])**2
-            ## One parent 1 gene, the other 2
-                elif(people[person]["mother"] in two_genes and people[person]["father"] in one_gene) or (people[person]["father"] in two_genes and people[person]["mother"] in one_gene):
-                    p1 = 0.5*(1-PROBS["mutation"])**2 + 0.5*(PROBS["mutation"])*(1-PROBS["mutation"])
-            ## Both parents 1 gene
-                elif(people[person]["mother"] in one_gene and people[person]["father"] in one_gene):
-                    p1 = 0.5**2*(1-PROBS["mutation"])**2 + 0.5**2*PROBS["mutation"]**2 + 2*0.5*(1-PROBS["mutation"])*0.5*(PROBS["mutation"])
-            ## One parent 2 genes, the other 0 
-                elif(people[person]["mother"] in two_genes and people[person]["father"] not in one_gene and people[person]["father"] not in two_genes) or (people[person]["father"] in two_genes and people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes):
-                    p1 = (1-PROBS["mutation"])*PROBS["mutation"]
-            p*=(p1*p2)
-
-        else:
-            if person in have_trait:
-                p2 = PROBS["trait"][0][True]
-            else:
-                p2 = PROBS["trait"][0][False]
-
-            if people[person]["mother"] == None and people[person]["father"] == None:
-                p1 = PROBS["gene"][0]
-            else:
-            ## Both parents 0 genes
-                if (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes) and  (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes):
-                    p1 = (1-PROBS["mutation"])**2
-            ## One parent 1 gene, the other 0
-                elif (people[person]["mother"] in one_gene and (people[person]["father"] not in one_gene and people[person]["father"] not in two_genes)) or (people[person]["father"] in one_gene and (people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes)):
-                    p1 = 0.5*(1-PROBS["mutation"])**2 + 0.5*PROBS["mutation"]*(1-PROBS["mutation"])
-            ## Both parents 2 genes
-                elif (people[person]["mother"] in two_genes and people[person]["father"] in two_genes):
-                    p1 = (PROBS["mutation"])**2
-            ## One parent 1 gene, the other 2
-                elif(people[person]["mother"] in two_genes and people[person]["father"] in one_gene) or (people[person]["father"] in two_genes and people[person]["mother"] in one_gene):
-                    p1 = 0.5*(1-PROBS["mutation"])*PROBS["mutation"] + 0.5*PROBS["mutation"]**2
-            ## Both parents 1 gene
-                elif(people[person]["mother"] in one_gene and people[person]["father"] in one_gene):
-                    p1 = 0.5**2*(1-PROBS["mutation"])**2 + 2*0.5*(PROBS["mutation"])*0.5*(1-PROBS["mutation"]) + 0.5**2*PROBS["mutation"]
-            ## One parent 2 genes, the other 0 
-                elif(people[person]["mother"] in two_genes and people[person]["father"] not in one_gene and people[person]["father"] not in two_genes) or (people[person]["father"] in two_genes and people[person]["mother"] not in one_gene and people[person]["mother"] not in two_genes):
-                    p1 *= PROBS["mutation"]*(1-PROBS["mutation"])
-            p *=(p1*p2)
-
-    return p
-        
-
-
+def subsets(s):
+    """
+    Yield every subset of s, one at a time, smallest first.
+    """
+    s = list(s)
+    for r in range(len(s) + 1):
+        for subset in itertools.combinations(s, r):
+            yield set(subset)
 
 
+def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
 
@@ -235,22 +820,33 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
-    ##raise NotImplementedError
+    def genes(person):
+        return 2 if person in two_genes else 1 if person in one_gene else 0
+
+    p = 1
+    for person in people:
+        mother, father = people[person]["mother"], people[person]["father"]
+        if mother is None:
+            p *= GENE_PRIOR[genes(person)]
+        else:
+            p *= INHERITANCE[genes(mother)][genes(father)][genes(person)]
+        p *= TRAIT_GIVEN_GENE[genes(person)][person in have_trait]
+    return p
 
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
     for person in probabilities:
         if person in have_trait:
-            probabilities[person]["trait"][True] = p
+            probabilities[person]["trait"][True] += p
         else:
-            probabilities[person]["trait"][False] = p
+            probabilities[person]["trait"][False] += p
 
         if person in one_gene:
-            probabilities[person]["gene"][1] = p
+            probabilities[person]["gene"][1] += p
         elif person in two_genes:
-            probabilities[person]["gene"][2] = p
+            probabilities[person]["gene"][2] += p
         else:
-            probabilities[person]["gene"][0] = p
+            probabilities[person]["gene"][0] += p
     """
     Add to `probabilities` a new joint probability `p`.
     Each person should have their "gene" and "trait" distributions updated.
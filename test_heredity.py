@@ -0,0 +1,81 @@
+import random
+
+import heredity
+
+
+def pedigree(size, seed=0):
+    """
+    Return a tree-shaped pedigree of about `size` people, in the shape
+    load_data returns, in which every founder's trait is known and
+    about two thirds of the children's traits are known.
+    """
+    rng = random.Random(seed)
+    people = {"0": {"name": "0", "mother": None, "father": None,
+                    "trait": rng.random() < 0.5}}
+    while len(people) < size:
+        mother = rng.choice(list(people))
+        father, child = str(len(people)), str(len(people) + 1)
+        people[father] = {"name": father, "mother": None, "father": None,
+                          "trait": rng.random() < 0.5}
+        people[child] = {"name": child, "mother": mother, "father": father,
+                         "trait": rng.choice([None, True, False])}
+    return people
+
+
+def worst_miss(people, probabilities, errors):
+    """
+    Return the largest gap between an estimate and the exact answer, in
+    multiples of the estimate's standard error.
+    """
+    exact = heredity.infer(people)
+    return max(
+        abs(probabilities[person][field][value] -
+            exact[person][field][value]) /
+        max(errors[person][field][value], 1e-9)
+        for person in people
+        for field in exact[person]
+        for value in exact[person][field]
+    )
+
+
+def test_sampling_errors_cover_exact_answer_with_many_known_traits():
+    people = pedigree(200)
+    probabilities, errors = heredity.sample_probabilities(
+        people, 20000, seed=0
+    )
+    assert worst_miss(people, probabilities, errors) < 4
+
+
+def test_target_error_is_not_met_on_degenerate_weights():
+    people = pedigree(200)
+    probabilities, errors = heredity.sample_probabilities(
+        people, 50000, target_error=0.05, seed=0
+    )
+    assert worst_miss(people, probabilities, errors) < 4
+    assert max(
+        errors[person][field][value]
+        for person in errors
+        for field in errors[person]
+        for value in errors[person][field]
+    ) > 0.05
+
+
+def test_sampling_stops_at_target_error_on_small_family():
+    people = {
+        "Harry": {"name": "Harry", "mother": "Lily", "father": "James",
+                  "trait": None},
+        "James": {"name": "James", "mother": None, "father": None,
+                  "trait": True},
+        "Lily": {"name": "Lily", "mother": None, "father": None,
+                 "trait": False}
+    }
+    probabilities, errors = heredity.sample_probabilities(
+        people, heredity.MAX_SAMPLES, target_error=0.005, seed=0
+    )
+    assert worst_miss(people, probabilities, errors) < 4
+    assert max(
+        errors[person][field][value]
+        for person in errors
+        for field in errors[person]
+        for value in errors[person][field]
+    ) <= 0.005
@@ -0,0 +1,129 @@
+import os
+import random
+
+import pagerank
+
+
+def write_corpus(directory, pages=1000, seed=0):
+    """
+    Write a random corpus of linked HTML pages to `directory` and
+    return the page names.
+    """
+    rng = random.Random(seed)
+    names = [f"{i}.html" for i in range(pages)]
+    for name in names:
+        links = rng.sample(names, rng.randint(0, 6))
+        with open(os.path.join(directory, name), "w") as f:
+            f.write("<html>\n")
+            for link in links:
+                f.write(f'<a href="{link}">{link}</a>\n')
+            f.write("</html>\n")
+    return names
+
+
+def add_link(directory, name, link):
+    with open(os.path.join(directory, name), "a") as f:
+        f.write(f'<a href="{link}">{link}</a>\n')
+
+
+def test_update_unchanged_corpus_takes_one_sweep(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_corpus(corpus)
+    store = tmp_path / "store.json"
+
+    pagerank.update_pagerank(corpus, store, workers=1)
+    ranks, second = pagerank.update_pagerank(corpus, store, workers=1)
+    assert second["parsed"] == 0
+    assert second["iterations"] == 1
+    assert abs(sum(ranks.values()) - 1) < 1e-9
+
+
+def test_update_warm_start_beats_cold_start(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    names = write_corpus(corpus)
+    store = tmp_path / "store.json"
+    pagerank.update_pagerank(corpus, store, workers=1)
+
+    # A small edit: one page gains a link
+    add_link(corpus, names[3], names[7])
+    warm, warm_summary = pagerank.update_pagerank(corpus, store, workers=1)
+
+    os.remove(store)
+    cold, cold_summary = pagerank.update_pagerank(corpus, store, workers=1)
+
+    assert warm_summary["parsed"] == 1
+    assert cold_summary["parsed"] == len(names)
+    assert warm_summary["iterations"] <= cold_summary["iterations"] - 5
+    assert max(abs(warm[name] - cold[name]) for name in names) < 1e-9
+
+
+def random_corpus(pages=300, seed=1):
+    """
+    Return a random corpus dictionary in which about a tenth of the
+    pages have no links.
+    """
+    rng = random.Random(seed)
+    names = [f"{i}.html" for i in range(pages)]
+    corpus = dict()
+    for name in names:
+        others = [other for other in names if other != name]
+        corpus[name] = (set() if rng.random() < 0.1 else
+                        set(rng.sample(others, rng.randint(1, 6))))
+    return corpus
+
+
+def test_vectorized_sampler_matches_iteration():
+    corpus = random_corpus()
+    exact = pagerank.iterate_pagerank_sparse(corpus, pagerank.DAMPING)
+
+    # As many surfers as samples: without burn-in, each would take one
+    # step from the uniform distribution
+    for surfers in (10 ** 6, 10000):
+        sampled = pagerank.sample_pagerank_vectorized(
+            corpus, pagerank.DAMPING, 10 ** 6, surfers=surfers, seed=0
+        )
+        error = sum(abs(sampled[page] - exact[page]) for page in corpus)
+        assert error < 0.03
+
+
+def communities_corpus(size=150, bridges=3, seed=0):
+    """
+    Return a corpus of two random communities joined by a few links,
+    on which power iteration converges slowly.
+    """
+    rng = random.Random(seed)
+    corpus = dict()
+    for side in ("a", "b"):
+        for i in range(size):
+            targets = {f"{side}{rng.randrange(size)}.html" for _ in range(4)}
+            corpus[f"{side}{i}.html"] = targets - {f"{side}{i}.html"}
+    for _ in range(bridges):
+        side, other = rng.choice([("a", "b"), ("b", "a")])
+        corpus[f"{side}{rng.randrange(size)}.html"].add(
+            f"{other}{rng.randrange(size)}.html"
+        )
+    return corpus
+
+
+def sweeps(corpus, solver):
+    residuals = []
+    pagerank.iterate_pagerank_sparse(
+        corpus, pagerank.DAMPING, solver=solver, residuals=residuals
+    )
+    return len(residuals)
+
+
+def test_extrapolation_saves_sweeps_on_slow_corpus():
+    corpus = communities_corpus()
+    jacobi = sweeps(corpus, "jacobi")
+    for solver in ("aitken", "quadratic"):
+        assert sweeps(corpus, solver) <= jacobi // 2
+
+
+def test_extrapolation_never_costs_sweeps():
+    corpus = random_corpus()
+    jacobi = sweeps(corpus, "jacobi")
+    for solver in ("aitken", "quadratic"):
+        assert sweeps(corpus, solver) <= jacobi
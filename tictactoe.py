@@ -3,21 +3,69 @@ Tic Tac Toe Player
 """
 
 import math
+import multiprocessing
+import os
+import sys
 import time
 import copy
+from concurrent.futures import ProcessPoolExecutor
 
 X = "X"
 O = "O"
 EMPTY = None
 
+# Bitboard engine: cell (i, j) is bit 3 * i + j of one 9-bit int per player
+FULL = 0b111111111
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100                # diagonals
+)
+WINNING = tuple(
+    any(cells & mask == mask for mask in WIN_MASKS) for cells in range(1 << 9)
+)
 
-def initial_state():
+# Opening book: the solved move for every 3 x 3 board, indexed base 3
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "tictactoe.book")
+BOOK_SIZE = 3 ** 9
+NO_MOVE = 0xFF
+TERNARY = tuple(
+    sum(3 ** cell for cell in range(9) if cells >> cell & 1)
+    for cells in range(1 << 9)
+)
+book = None
+
+# Directions of a line on the board: across, down and both diagonals
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# Depth-limited search on larger boards
+TIME_BUDGET = 1.0
+WIN_SCORE = 10 ** 9
+NEIGHBOURHOOD = 2
+
+# Lines of k cells and the indices of the lines through each cell, keyed
+# on (rows, columns, k), and line values by marks held, keyed on k
+windows = dict()
+cell_windows = dict()
+line_scores = dict()
+
+# Best root value so far, shared by the processes of a root-split search
+shared_bound = None
+
+# Number of positions visited by maxvalue/minvalue
+nodes = 0
+
+# Minimax values of solved positions, keyed on canonical position
+transpositions = dict()
+
+
+def initial_state(rows=3, columns=3):
     """
-    Returns starting state of the board.
+    Returns starting state of a board with the given number of rows and
+    columns (3 x 3 by default).
     """
-    return [[EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY]]
+    return [[EMPTY] * columns for _ in range(rows)]
 
 
 def player(board):
@@ -75,117 +123,786 @@ def result(board, action):
     raise NotImplementedError
 
 
-def winner(board):
-    """
-    Returns the winner of the game, if there is one.
-    """
-    # Check rows
-    #if (board[0][2] == X and board[1][2] == X and board[2][2] == X):
-    #    return X
-    if all(i == board[0][0]!= None for i in board[0]):
-        return board[0][0]
-    elif all(i == board[1][0]!= None for i in board[1]):
-        return board[1][0]
-    elif all(i == board[2][0]!= None for i in board[2]):
-        return board[2][0]
-    # Check columns
-    elif board[0][0] == board[1][0] and board[1][0] == board[2][0] != None:
-        return board[0][0]
-    elif board[0][1] == board[1][1] and board[1][1] == board[2][1] != None:
-        return board[0][1]
-    elif board[0][2] == board[1][2] and board[1][2] == board[2][2] != None:
-        return board[0][2]
-    # Check diagonals
-    elif board[0][0] == board[1][1] and board[1][1] == board[2][2] != None:
-        return board[0][0]
-    elif board[0][2] == board[1][1] and board[1][1] == board[2][0] != None:
-        return board[0][2]
-    else:
-        return None
-    
+def winner(board, k=None):
     """
-    Returns the winner of the game, if there is one.
+    Returns the winner of the game, if there is one: the player with k
+    marks in a row, column or diagonal (see win_length for the default).
     """
-    raise NotImplementedError
+    k = k or win_length(board)
+    for i, row in enumerate(board):
+        for j, mark in enumerate(row):
+            if mark is not EMPTY and wins_at(board, (i, j), k):
+                return mark
+    return None
 
 
-def terminal(board):
-    if winner(board) is not None:
-        return True
-    elif winner(board) is None and (EMPTY in board[0] or EMPTY in board[1] or EMPTY in board[2]):
-        return False
-    else:
-        return True
+def terminal(board, k=None):
     """
     Returns True if game is over, False otherwise.
     """
-    raise NotImplementedError
+    if winner(board, k) is not None:
+        return True
+    return not any(EMPTY in row for row in board)
 
 
-def utility(board):
-    if winner(board) == X:
+def utility(board, k=None):
+    """
+    Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
+    """
+    mark = winner(board, k)
+    if mark == X:
         return 1
-    elif winner(board) == O:
+    elif mark == O:
         return -1
     else:
         return 0
+
+
+def win_length(board):
     """
-    Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
+    Returns the default number of marks in a row needed to win: the
+    shorter side of the board, but at most 5 (as in gomoku).
     """
-    raise NotImplementedError
+    return min(len(board), len(board[0]), 5)
 
-def maxvalue(board):
-        
-        if terminal(board):
-            return utility(board), None
-        v = -math.inf
-        optimum = None
-        for action in actions(board):
-            x, z = minvalue(result(board,action))
-            if x>v:
-                v = x
-                optimum = action
-                if v == 1:
-                    return v, optimum
-           
-            
-        
-        return v,optimum
-
-def minvalue(board):
-      
-        if terminal(board):
-            return utility(board), None
-        v = math.inf
-        optimum = None
-        for action in actions(board): 
-            y, z = maxvalue(result(board,action))
-            if y < v:
-                v = y   
-                optimum = action
-                if v == -1:
-                    return v, optimum
-        
-        return v,optimum
-
-
-def minimax(board):
-  
-    
+
+def wins_at(board, action, k):
+    """
+    Returns True if the mark at `action` is part of k in a row, checking
+    only the four lines through that cell.
+    """
+    i, j = action
+    mark = board[i][j]
+    rows, columns = len(board), len(board[0])
+    for di, dj in DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            y, x = i + sign * di, j + sign * dj
+            while 0 <= y < rows and 0 <= x < columns and board[y][x] == mark:
+                count += 1
+                y, x = y + sign * di, x + sign * dj
+        if count >= k:
+            return True
+    return False
+
+
+def maxvalue(board, alpha=-math.inf, beta=math.inf, prune=True):
+    """
+    Returns (value, action) for X on the board, searching with alpha-beta
+    pruning and moves ordered centre, corners, edges. With prune=False,
+    every child is searched in arbitrary order until a win is found.
+    """
+    global nodes
+    nodes += 1
     if terminal(board):
-        return None
-    elif player(board) == X:
-        value, move = maxvalue(board)
-        print(move)
-        return move
-              
-    elif player(board) == O:
-        value, move = minvalue(board)
-        print(move)
-        return move
-       
+        return utility(board), None
+    v = -math.inf
+    optimum = None
+    for action in ordered_actions(board) if prune else actions(board):
+        x, z = minvalue(result(board, action), alpha, beta, prune)
+        if x > v:
+            v = x
+            optimum = action
+            if v == 1:
+                return v, optimum
+        if prune:
+            alpha = max(alpha, v)
+            if alpha >= beta:
+                break
+    return v, optimum
+
+
+def minvalue(board, alpha=-math.inf, beta=math.inf, prune=True):
+    """
+    Returns (value, action) for O on the board; see maxvalue.
+    """
+    global nodes
+    nodes += 1
+    if terminal(board):
+        return utility(board), None
+    v = math.inf
+    optimum = None
+    for action in ordered_actions(board) if prune else actions(board):
+        y, z = maxvalue(result(board, action), alpha, beta, prune)
+        if y < v:
+            v = y
+            optimum = action
+            if v == -1:
+                return v, optimum
+        if prune:
+            beta = min(beta, v)
+            if alpha >= beta:
+                break
+    return v, optimum
+
+
+def ordered_actions(board):
+    """
+    Returns the possible actions on the board from the centre outwards,
+    corners of each ring before its edges (centre, corners, edges on a
+    3 x 3 board).
+    """
+    rows, columns = len(board), len(board[0])
+
+    def order(action):
+        dy = abs(2 * action[0] - (rows - 1))
+        dx = abs(2 * action[1] - (columns - 1))
+        return max(dy, dx), -(dy + dx)
+
+    return sorted(actions(board), key=order)
+
+
+def evaluate(board, k):
+    """
+    Returns a heuristic value of the board for X: every line of k cells
+    holding marks of only one player scores 10 ** (marks - 1) for that
+    player.
+    """
+    score = 0
+    for window in _windows(len(board), len(board[0]), k):
+        crosses = noughts = 0
+        for i, j in window:
+            mark = board[i][j]
+            if mark == X:
+                crosses += 1
+            elif mark == O:
+                noughts += 1
+        score += _line_score(crosses, noughts)
+    return score
 
+
+def line_counts(board, k):
+    """
+    Returns (crosses, noughts): how many marks of each player every line
+    of k cells (in the order of _windows) holds.
+    """
+    crosses, noughts = [], []
+    for window in _windows(len(board), len(board[0]), k):
+        marks = [board[i][j] for i, j in window]
+        crosses.append(marks.count(X))
+        noughts.append(marks.count(O))
+    return crosses, noughts
+
+
+def move_deltas(board, actions, turn, lines, k):
+    """
+    Returns how much evaluate(board, k) changes if `turn` plays each of
+    `actions`, given `lines` = line_counts(board, k), rescoring only the
+    lines through each cell.
+    """
+    through = _cell_windows(len(board), len(board[0]), k)
+    scores = _line_scores(k)
+    own, other = lines if turn == X else reversed(lines)
+    sign = 1 if turn == X else -1
+    deltas = []
+    for i, j in actions:
+        delta = 0
+        for w in through[i][j]:
+            if other[w] == 0:
+                n = own[w]
+                delta += scores[n + 1][0] - scores[n][0]
+            elif own[w] == 0:
+                # Blocking a line of the other player's marks
+                delta -= scores[0][other[w]]
+        deltas.append(sign * delta)
+    return deltas
+
+
+def _line_scores(k):
+    """
+    Returns a table of _line_score(crosses, noughts) for up to k marks
+    each, cached.
+    """
+    if k not in line_scores:
+        line_scores[k] = [
+            [_line_score(crosses, noughts) for noughts in range(k + 1)]
+            for crosses in range(k + 1)
+        ]
+    return line_scores[k]
+
+
+def _line_score(crosses, noughts):
+    """
+    Returns the value for X of one line holding the given marks.
+    """
+    if crosses and not noughts:
+        return 10 ** (crosses - 1)
+    if noughts and not crosses:
+        return -10 ** (noughts - 1)
+    return 0
+
+
+def _windows(rows, columns, k):
+    """
+    Returns every line of k cells on a rows x columns board, cached.
+    """
+    key = (rows, columns, k)
+    if key not in windows:
+        windows[key] = [
+            [(i + n * di, j + n * dj) for n in range(k)]
+            for i in range(rows)
+            for j in range(columns)
+            for di, dj in DIRECTIONS
+            if 0 <= i + (k - 1) * di < rows and
+            0 <= j + (k - 1) * dj < columns
+        ]
+    return windows[key]
+
+
+def _cell_windows(rows, columns, k):
+    """
+    Returns, for every cell of a rows x columns board, the indices in
+    _windows of the lines of k cells through it, cached.
+    """
+    key = (rows, columns, k)
+    if key not in cell_windows:
+        through = [[[] for _ in range(columns)] for _ in range(rows)]
+        for w, window in enumerate(_windows(rows, columns, k)):
+            for i, j in window:
+                through[i][j].append(w)
+        cell_windows[key] = through
+    return cell_windows[key]
+
+
+def candidates(board, radius=NEIGHBOURHOOD, near=None):
+    """
+    Returns the empty cells within `radius` of a mark (every empty cell
+    if there are none), nearest the centre first. On an empty board only
+    the centre is returned. `near` may give nearby(board, radius).
+    """
+    rows, columns = len(board), len(board[0])
+    cells = nearby(board, radius) if near is None else near
+    if not cells:
+        if all(mark is EMPTY for row in board for mark in row):
+            return [((rows - 1) // 2, (columns - 1) // 2)]
+        cells = {(i, j) for i, row in enumerate(board)
+                 for j, mark in enumerate(row) if mark is EMPTY}
+    return sorted(cells, key=lambda cell: (abs(2 * cell[0] - (rows - 1)) +
+                                           abs(2 * cell[1] - (columns - 1)),
+                                           cell))
+
+
+def nearby(board, radius=NEIGHBOURHOOD):
+    """
+    Returns the set of empty cells within `radius` of a mark.
+    """
+    cells = set()
+    for i, row in enumerate(board):
+        for j, mark in enumerate(row):
+            if mark is not EMPTY:
+                cells |= _around(board, (i, j), radius)
+    return cells
+
+
+def _around(board, action, radius=NEIGHBOURHOOD):
+    """
+    Returns the set of empty cells within `radius` of `action`.
+    """
+    i, j = action
+    rows, columns = len(board), len(board[0])
+    return {
+        (y, x)
+        for y in range(max(0, i - radius), min(rows, i + radius + 1))
+        for x in range(max(0, j - radius), min(columns, j + radius + 1))
+        if board[y][x] is EMPTY
+    }
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a depth-limited search when its deadline has passed.
+    """
+
+
+def depth_limited(board, depth, k, alpha=-math.inf, beta=math.inf,
+                  last=None, deadline=None, first=None, turn=None, score=None,
+                  lines=None, near=None):
+    """
+    Returns (value, action) for the player to move on the board, looking
+    `depth` moves ahead and scoring the frontier with evaluate. Wins are
+    worth WIN_SCORE plus the depth left, so quicker wins score higher.
+    `last` is the move that led to the board, and `first` an action to
+    search before the others.
+
+    `turn` (the player to move), `score` (evaluate of the board), `lines`
+    (its line_counts) and `near` (its nearby cells) are worked out if
+    not given, then updated for each move and passed down the recursion,
+    so a node only rescores the lines through the move that led to it.
+    Moves are searched in order of how much they change the score, best
+    for the player to move first.
+
+    The board and `lines` are updated in place and restored before
+    returning.
+    """
+    global nodes
+    nodes += 1
+    if deadline is not None and nodes % 256 == 0:
+        if time.perf_counter() > deadline:
+            raise SearchTimeout
+    if last is not None and wins_at(board, last, k):
+        mark = board[last[0]][last[1]]
+        return (WIN_SCORE + depth) * (1 if mark == X else -1), None
+    if score is None:
+        score = evaluate(board, k)
+    if depth == 0:
+        return score, None
+    if turn is None:
+        turn = player(board)
+    if lines is None:
+        lines = line_counts(board, k)
+    if near is None:
+        near = nearby(board)
+    moves = _ordered_moves(board, k, turn, lines, near, first)
+    if not moves:
+        return 0, None
+
+    through = _cell_windows(len(board), len(board[0]), k)
+    counts = lines[0] if turn == X else lines[1]
+    following = O if turn == X else X
+    v = -math.inf if turn == X else math.inf
+    optimum = None
+    for action, delta in moves:
+        i, j = action
+        board[i][j] = turn
+        for w in through[i][j]:
+            counts[w] += 1
+        try:
+            value, _ = depth_limited(
+                board, depth - 1, k, alpha, beta, action, deadline,
+                turn=following, score=score + delta, lines=lines,
+                near=(near - {action}) | _around(board, action)
+                if depth > 1 else None
+            )
+        finally:
+            board[i][j] = EMPTY
+            for w in through[i][j]:
+                counts[w] -= 1
+        if turn == X and value > v:
+            v, optimum = value, action
+            alpha = max(alpha, v)
+        elif turn == O and value < v:
+            v, optimum = value, action
+            beta = min(beta, v)
+        if alpha >= beta:
+            break
+    return v, optimum
+
+
+def _ordered_moves(board, k, turn, lines, near, first=None):
+    """
+    Returns (action, delta) for every candidate move of `turn`, where
+    delta is the change the move makes to evaluate, best for `turn`
+    first (ties nearest the centre), with `first` ahead of the rest.
+    """
+    rows, columns = len(board), len(board[0])
+    actions = list(near) if near else candidates(board)
+    sign = -1 if turn == X else 1
+    moves = sorted(
+        zip(actions, move_deltas(board, actions, turn, lines, k)),
+        key=lambda move: (sign * move[1],
+                          abs(2 * move[0][0] - (rows - 1)) +
+                          abs(2 * move[0][1] - (columns - 1)),
+                          move[0])
+    )
+    for n, (action, _) in enumerate(moves):
+        if action == first:
+            moves.insert(0, moves.pop(n))
+            break
+    return moves
+
+
+def iterative_deepening(board, k=None, budget=TIME_BUDGET, workers=None):
+    """
+    Returns the best action found for the player to move by depth-limited
+    searches of increasing depth, stopping after `budget` seconds or once
+    the outcome is decided. The best move so far is searched first. With
+    `workers`, each depth is split across a process pool at the root.
+    """
+    k = k or win_length(board)
+    board = [row[:] for row in board]
+    deadline = time.perf_counter() + budget
+    empty = sum(row.count(EMPTY) for row in board)
+    optimum = None
+    pool = bound = None
+    if workers:
+        bound = multiprocessing.Value("d")
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_search_worker,
+                                   initargs=(bound,))
+    try:
+        for depth in range(1, empty + 1):
+            try:
+                if pool is None:
+                    value, action = depth_limited(board, depth, k,
+                                                  deadline=deadline,
+                                                  first=optimum)
+                else:
+                    value, action = _root_split(pool, bound, board, depth, k,
+                                                deadline, optimum)
+            except SearchTimeout:
+                break
+            optimum = action
+            if abs(value) >= WIN_SCORE:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return optimum or candidates(board)[0]
+
+
+def parallel_search(board, depth, k=None, workers=None):
+    """
+    Returns (value, action) as depth_limited would for the player to move,
+    searching each root action in a process pool of `workers` processes.
+    """
+    k = k or win_length(board)
+    bound = multiprocessing.Value("d")
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_search_worker,
+                             initargs=(bound,)) as pool:
+        return _root_split(pool, bound, board, depth, k)
+
+
+def _root_split(pool, bound, board, depth, k, deadline=None, first=None):
+    """
+    Searches every root action of the board in `pool`, sharing the best
+    value found so far through `bound`, and returns (value, action) for
+    the first best action in the order depth_limited would use.
+    """
+    turn = player(board)
+    moves = [
+        action for action, _ in _ordered_moves(
+            board, k, turn, line_counts(board, k), nearby(board), first
+        )
+    ]
+    if depth == 0 or not moves:
+        return depth_limited(board, depth, k)
+
+    bound.value = -math.inf if turn == X else math.inf
+    futures = [
+        pool.submit(_search_root_action, board, action, depth, k, deadline)
+        for action in moves
+    ]
+    v = -math.inf if turn == X else math.inf
+    optimum = None
+    for action, future in zip(moves, futures):
+        value, exact = future.result()
+        if exact and (value > v if turn == X else value < v):
+            v, optimum = value, action
+    return v, optimum
+
+
+def _init_search_worker(bound):
+    """
+    Keeps the shared bound of a root-split search in each pool process.
+    """
+    global shared_bound
+    shared_bound = bound
+
+
+def _search_root_action(board, action, depth, k, deadline):
+    """
+    Returns (value, exact) for playing `action` on the board: the search
+    window starts one point short of the shared bound, so a result inside
+    it is exact, and ties with the best action so far are still found.
+    """
+    turn = player(board)
+    board[action[0]][action[1]] = turn
+    bound = shared_bound.value
+    if turn == X:
+        alpha, beta = bound - 1, math.inf
+    else:
+        alpha, beta = -math.inf, bound + 1
+    value, _ = depth_limited(board, depth - 1, k, alpha, beta, action,
+                             deadline)
+    with shared_bound.get_lock():
+        if turn == X and value > shared_bound.value:
+            shared_bound.value = value
+        elif turn == O and value < shared_bound.value:
+            shared_bound.value = value
+    return value, (value > alpha if turn == X else value < beta)
+
+
+def minimax(board, k=None, budget=TIME_BUDGET, workers=None):
     """
     Returns the optimal action for the current player on the board.
+
+    A 3 x 3 board is looked up in the opening book, falling back to
+    best_move for positions the book leaves out; larger boards (k in
+    a row, see win_length) get the best move iterative deepening finds
+    within `budget` seconds, on `workers` processes if given.
     """
-    raise NotImplementedError
+    if terminal(board, k):
+        return None
+    if len(board) == len(board[0]) == 3 and k in (None, 3):
+        entry = book_lookup(board)
+        move = best_move(board) if entry is None else entry[1]
+    else:
+        move = iterative_deepening(board, k, budget, workers)
+    print(move)
+    return move
+
+
+def _symmetries():
+    """
+    Returns the 8 symmetries of the board, each as a table mapping every
+    9-bit set of cells to its image.
+    """
+    tables = []
+    for turns in range(4):
+        for flip in (False, True):
+            image = []
+            for i in range(3):
+                for j in range(3):
+                    a, b = (i, 2 - j) if flip else (i, j)
+                    for _ in range(turns):
+                        a, b = b, 2 - a
+                    image.append(3 * a + b)
+            tables.append(tuple(
+                sum(1 << image[cell] for cell in range(9) if cells >> cell & 1)
+                for cells in range(1 << 9)
+            ))
+    return tables
+
+
+SYMMETRIES = _symmetries()
+
+
+def to_bitboard(board):
+    """
+    Returns the board as a pair (x, o) of 9-bit ints of each player's cells.
+    """
+    x = o = 0
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell == X:
+                x |= 1 << (3 * i + j)
+            elif cell == O:
+                o |= 1 << (3 * i + j)
+    return x, o
+
+
+def canonical(x, o):
+    """
+    Returns a key shared by all positions equivalent to (x, o) under
+    rotation and reflection.
+    """
+    return min(table[x] << 9 | table[o] for table in SYMMETRIES)
+
+
+def solve(x, o):
+    """
+    Returns the minimax value of the bitboard position (x, o): 1 if X
+    wins with best play, -1 if O wins, 0 for a draw.
+    """
+    if WINNING[x]:
+        return 1
+    if WINNING[o]:
+        return -1
+    empty = FULL & ~(x | o)
+    if not empty:
+        return 0
+
+    key = canonical(x, o)
+    if key in transpositions:
+        return transpositions[key]
+
+    # X moves whenever both players have the same number of cells
+    x_turn = bin(x).count("1") == bin(o).count("1")
+    best = -2 if x_turn else 2
+    while empty:
+        move = empty & -empty
+        empty ^= move
+        if x_turn:
+            best = max(best, solve(x | move, o))
+            if best == 1:
+                break
+        else:
+            best = min(best, solve(x, o | move))
+            if best == -1:
+                break
+    transpositions[key] = best
+    return best
+
+
+def best_move(board):
+    """
+    Returns the optimal action for the current player on the board using
+    the bitboard engine, or None if the game is over.
+    """
+    x, o = to_bitboard(board)
+    if WINNING[x] or WINNING[o] or x | o == FULL:
+        return None
+    _, cell = _best(x, o)
+    return cell // 3, cell % 3
+
+
+def _best(x, o):
+    """
+    Returns (value, cell) of the first optimal move in the bitboard
+    position (x, o), which must not be over.
+    """
+    x_turn = bin(x).count("1") == bin(o).count("1")
+    optimum = None
+    for cell in range(9):
+        move = 1 << cell
+        if (x | o) & move:
+            continue
+        value = solve(x | move, o) if x_turn else solve(x, o | move)
+        if optimum is None or (value > best if x_turn else value < best):
+            best, optimum = value, cell
+    return best, optimum
+
+
+def build_book():
+    """
+    Solves every reachable position and returns the opening book: one
+    byte per board, indexed by book_index, holding (value + 1) << 4 | cell
+    for the optimal move, or NO_MOVE if the game is over or the board
+    cannot be reached.
+    """
+    table = bytearray([NO_MOVE]) * BOOK_SIZE
+    seen = set()
+    frontier = [(0, 0)]
+    while frontier:
+        x, o = frontier.pop()
+        index = TERNARY[x] + 2 * TERNARY[o]
+        if index in seen:
+            continue
+        seen.add(index)
+        if WINNING[x] or WINNING[o] or x | o == FULL:
+            continue
+        value, cell = _best(x, o)
+        table[index] = (value + 1) << 4 | cell
+        x_turn = bin(x).count("1") == bin(o).count("1")
+        empty = FULL & ~(x | o)
+        while empty:
+            move = empty & -empty
+            empty ^= move
+            frontier.append((x | move, o) if x_turn else (x, o | move))
+    return bytes(table)
+
+
+def write_book(path=BOOK_PATH):
+    """
+    Builds the opening book and writes it to `path`.
+    """
+    table = build_book()
+    with open(path, "wb") as f:
+        f.write(table)
+    return table
+
+
+def load_book(path=BOOK_PATH):
+    """
+    Returns the opening book, read from `path` on first use, or built in
+    memory if the file is missing or the wrong size.
+    """
+    global book
+    if book is None:
+        try:
+            with open(path, "rb") as f:
+                table = f.read()
+        except OSError:
+            table = b""
+        book = table if len(table) == BOOK_SIZE else build_book()
+    return book
+
+
+def book_index(board):
+    """
+    Returns the base-3 index of a 3 x 3 board: cell (i, j) is digit
+    3 * i + j, with 0 for EMPTY, 1 for X and 2 for O.
+    """
+    index = 0
+    for row in reversed(board):
+        for mark in reversed(row):
+            index = 3 * index + (1 if mark == X else 2 if mark == O else 0)
+    return index
+
+
+def book_lookup(board):
+    """
+    Returns (value, action) for the player to move on a 3 x 3 board from
+    the opening book, or None if the game is over or the position cannot
+    arise in play (such as O moving first).
+    """
+    entry = load_book()[book_index(board)]
+    if entry == NO_MOVE:
+        return None
+    cell = entry & 0x0F
+    return (entry >> 4) - 1, (cell // 3, cell % 3)
+
+
+def benchmark():
+    """
+    Time a full-tree solve from the empty board with the list-based
+    search, with and without alpha-beta, and with the bitboard engine.
+    """
+    global nodes, book
+    for prune, label in ((False, "List search"), (True, "Alpha-beta")):
+        nodes = 0
+        start = time.perf_counter()
+        value, _ = maxvalue(initial_state(), prune=prune)
+        elapsed = time.perf_counter() - start
+        print(f"{label + ':':16} value {value}, {elapsed:.3f}s, "
+              f"{nodes} nodes")
+
+    transpositions.clear()
+    start = time.perf_counter()
+    value = solve(0, 0)
+    elapsed = time.perf_counter() - start
+    print(f"Bitboard engine: value {value}, {elapsed:.3f}s, "
+          f"{len(transpositions)} positions in table")
+
+    start = time.perf_counter()
+    table = build_book()
+    elapsed = time.perf_counter() - start
+    solved = BOOK_SIZE - table.count(NO_MOVE)
+    print(f"Opening book:    {solved} positions, {len(table)} bytes, "
+          f"built in {elapsed:.3f}s")
+
+    book = table
+    board = initial_state()
+    lookups = 100000
+    start = time.perf_counter()
+    for _ in range(lookups):
+        book_lookup(board)
+    elapsed = time.perf_counter() - start
+    print(f"Book lookup:     {elapsed / lookups * 1e6:.2f}us per position")
+
+
+def benchmark_parallel(depth=3, counts=(1, 2, 4)):
+    """
+    Time a depth-limited search of a 15 x 15 middle game position alone
+    and split at the root across each number of workers in `counts`.
+    """
+    board = initial_state(15, 15)
+    for i, j in ((7, 7), (7, 8), (8, 8), (6, 6), (8, 6), (6, 8), (9, 9)):
+        board[i][j] = player(board)
+    k = win_length(board)
+
+    start = time.perf_counter()
+    expected = depth_limited(board, depth, k)
+    base = time.perf_counter() - start
+    print(f"Sequential:   {expected[1]}, {base:.3f}s")
+    for workers in counts:
+        start = time.perf_counter()
+        found = parallel_search(board, depth, k, workers)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:2} workers:   {found[1]}, {elapsed:.3f}s, "
+              f"{base / elapsed:.2f}x"
+              f"{'' if found == expected else ' (different move!)'}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--benchmark"]:
+        benchmark()
+    elif sys.argv[1:] == ["--parallel"]:
+        benchmark_parallel()
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == "--book":
+        table = write_book(*sys.argv[2:])
+        print(f"Wrote {BOOK_SIZE - table.count(NO_MOVE)} positions")
+    else:
+        sys.exit("Usage: python tictactoe.py --benchmark | --parallel\n"
+                 "       python tictactoe.py --book [path]")